@@ -1,53 +1,187 @@
 # Slightly modified version from adafruit website&forums
 # https://cdn-learn.adafruit.com/downloads/pdf/adafruits-raspberry-pi-lesson-11-ds18b20-temperature-sensing.pdf
 # https://forums.raspberrypi.com/viewtopic.php?t=35508
+# Bulk conversion of every probe on the bus w/ the w1_therm driver's therm_bulk_read
+# https://www.kernel.org/doc/html/latest/w1/slaves/w1_therm.html
 
 from os import system
+from os.path import basename
+from csv import reader, writer
 from glob import glob
-from time import sleep
+from time import sleep, monotonic
+
+# names given to the probes in order of their 1-Wire IDs. probes past these are named by their ID.
+# adding a probe can change the order, so pin the names w/ a dictionary of ID: name instead
+PROBE_NAMES = ('reservoir', 'channel', 'ambient')
+# longest time (s) a conversion takes at each resolution (bits). 12 bits is 0.0625 C, 9 bits is 0.5 C
+CONVERSION_TIME = {9: .09375, 10: .1875, 11: .375, 12: .75}
+
+
+def load_names(path) -> dict:
+    '''Load the ID: name dictionary of the probes saved by TempReader.save_names().
+    Raises OSError if the file cannot be read, ValueError if it is not a list of IDs and names'''
+    with open(path, 'r', newline='') as f:
+        rows = [row for row in reader(f) if row]
+    names = {}
+    for row in rows[1:]:
+        if len(row) != 2:
+            raise ValueError(f"Each probe needs an ID and a name, not {row}")
+        names[row[0].strip()] = row[1].strip()
+    return names
+
+
+def resolution_for(period) -> int:
+    '''Gives the highest resolution (bits) whose conversion takes at most half of the
+    period (s) between readings, so reading the probes never takes up most of the period'''
+    fits = [bits for bits, t in CONVERSION_TIME.items() if t <= period/2]
+    return max(fits) if fits else min(CONVERSION_TIME)
+
 
 class TempReader(object):
-    '''Raspberry pi module to use 1-Wire interface to read temperature 
-    from a DS18B20. Ensure the 1-Wire interface is enabled in the RPi 
-    configuration settings. temp_sensor_pin should always be 28, GPIO pin 4'''
-    def __init__(self, temp_sensor_pin=28):
+    '''Raspberry pi module to use 1-Wire interface to read temperature
+    from a DS18B20. Ensure the 1-Wire interface is enabled in the RPi
+    configuration settings. temp_sensor_pin should always be 28, GPIO pin 4
+
+    Every DS18B20 on the bus is found and named. names is either a sequence
+    of names given in order of the probes' IDs or a dictionary of ID: name.
+    read_temp() reads the first probe, read_all() reads all of them.
+
+    resolution (9 to 12 bits) trades precision for conversion time, see
+    CONVERSION_TIME and resolution_for(). None leaves the probes as they are.'''
+    def __init__(self, temp_sensor_pin=28, names=PROBE_NAMES, resolution=None):
         system('/sbin/modprobe w1-therm')
- 
+
         self.temp_sensor_pin = temp_sensor_pin
         self.base_dir = '/sys/bus/w1/devices/'
-        try:
-            self.device_folder = glob(
-                self.base_dir + '28*')[0]
-            #print(glob.glob(self.base_dir + '28*'))
-        except AttributeError:
-            raise Exception("The temperature sensor is undetected.")
+        folders = sorted(glob(self.base_dir + '28*'))
+        if not folders:
+            raise IndexError("The temperature sensor is undetected.")
+        # name: w1_slave file of each probe
+        self.devices = {}
+        # name: sysfs folder of each probe
+        self.folders = {}
+        # name: 1-Wire ID of each probe
+        self.ids = {}
+        for i, folder in enumerate(folders):
+            probe_id = basename(folder)
+            if isinstance(names, dict):
+                name = names.get(probe_id, probe_id)
+            else:
+                name = names[i] if i < len(names) else probe_id
+            self.devices[name] = folder + '/w1_slave'
+            self.folders[name] = folder
+            self.ids[name] = probe_id
+        self.names = tuple(self.devices)
+        self.device_folder = folders[0]
         self.device_file = self.device_folder + '/w1_slave'
+        # starts one conversion on every probe at once. only in newer kernels
+        self.bulk_file = self.base_dir + 'w1_bus_master1/therm_bulk_read'
+        self.resolution = self.read_resolution()
+        if resolution is not None:
+            self.set_resolution(resolution)
 
-    def read_temp_raw(self):
-        f = open(self.device_file, 'r')
+    def save_names(self, path):
+        '''Save the ID and name of every probe as a CSV, to pass back in as names w/ load_names()'''
+        with open(path, 'w', newline='') as f:
+            w = writer(f)
+            w.writerow(('id', 'name'))
+            w.writerows((probe_id, name) for name, probe_id in self.ids.items())
+
+    def read_resolution(self) -> int:
+        '''Gives the resolution (bits) of the first probe. 12, the DS18B20's default,
+        if the kernel does not show it'''
+        try:
+            with open(self.device_folder + '/resolution', 'r') as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return 12
+
+    def set_resolution(self, bits) -> bool:
+        '''Set the resolution (9 to 12 bits) of every probe. Gives False if the kernel
+        did not take it for every probe, in which case resolution is what the first probe reports'''
+        if bits not in CONVERSION_TIME:
+            raise ValueError(f"Resolution must be 9 to 12 bits, not {bits}")
+        done = True
+        for folder in self.folders.values():
+            try:
+                with open(folder + '/resolution', 'w') as f:
+                    f.write(f'{bits}\n')
+            except OSError:
+                done = False
+        self.resolution = bits if done else self.read_resolution()
+        return done
+
+    @property
+    def conversion_time(self) -> float:
+        '''Longest time (s) a conversion takes at the current resolution'''
+        return CONVERSION_TIME.get(self.resolution, CONVERSION_TIME[12])
+
+    def read_temp_raw(self, device_file=None):
+        f = open(self.device_file if device_file is None else device_file, 'r')
         lines = f.readlines()
         f.close()
         return lines
 
-    def read_temp(self):
-        ''' Gives dictionary of Celsius and Farenheit reading'''
-        lines = self.read_temp_raw()
-        while lines[0].strip()[-3:] != 'YES':
+    def read_temp(self, retries=3, device_file=None):
+        ''' Gives dictionary of Celsius and Farenheit reading. Each read waits
+        for the sensor's conversion (up to 750 ms at 12 bits), so call it from a background
+        thread. Raises OSError if the CRC check fails retries more times'''
+        lines = self.read_temp_raw(device_file)
+        for attempt in range(retries):
+            if lines[0].strip()[-3:] == 'YES':
+                break
             sleep(0.1)
-            lines = self.read_temp_raw()
+            lines = self.read_temp_raw(device_file)
+        if lines[0].strip()[-3:] != 'YES':
+            raise OSError("The temperature sensor failed its CRC check")
         equals_pos = lines[1].find('t=')
-        if equals_pos != -1:
-            temp_string = lines[1][equals_pos+2:]
-            temp_c = float(temp_string)/1000.0
-            temp_f = (temp_c * 9.0/5.0) + 32.0
+        if equals_pos == -1:
+            raise ValueError("The temperature sensor gave no reading")
+        temp_string = lines[1][equals_pos+2:]
+        temp_c = float(temp_string)/1000.0
+        temp_f = (temp_c * 9.0/5.0) + 32.0
         tempdict = {
             'temp_c': temp_c,
             'temp_f': temp_f
         }
         return tempdict
-    
+
+    def bulk_convert(self, timeout=None) -> bool:
+        '''Start a conversion on every probe at once and wait for all of them to finish,
+        so reading the probes afterwards does not wait on a conversion for each one.
+        Gives False if the kernel does not support it or it did not finish in time
+        (twice the conversion time by default)'''
+        timeout = 2*self.conversion_time if timeout is None else timeout
+        try:
+            with open(self.bulk_file, 'w') as f:
+                f.write('trigger\n')
+            end = monotonic() + timeout
+            while monotonic() < end:
+                with open(self.bulk_file, 'r') as f:
+                    # -1 while any probe is still converting
+                    if f.read().strip() != '-1':
+                        return True
+                sleep(0.05)
+        except OSError:
+            pass
+        return False
+
+    def read_all(self, retries=3) -> dict:
+        ''' Gives a dictionary of name: reading of every probe. The reading is the
+        dictionary of read_temp(), or None if that probe could not be read'''
+        if len(self.devices) > 1:
+            self.bulk_convert()
+        readings = {}
+        for name, device_file in self.devices.items():
+            try:
+                readings[name] = self.read_temp(retries, device_file)
+            except (OSError, ValueError, IndexError):
+                readings[name] = None
+        return readings
+
 if __name__ == '__main__':
     tempSens = TempReader()
+    print(tempSens.names)
     for i in range(5):
         sleep(5)
-        print(tempSens.read_temp())
+        print(tempSens.read_all())
@@ -9,21 +9,125 @@
 #   v0.80 06-Nov-2021 Following discretization process of curiores
 #   v0.99 28-Nov-2021 First draft implementation of filter
 #   v1.00 15-Feb-2022 Working version to take in a single value at a time. Only tested w/ 2nd order
+#
+# The bilinear transform is done here w/ numpy alone so scipy is not imported when the
+# controller starts. scipy is only used to check the designs (python3 -m lib.butterworth.benchmark)
+# and by filter_batch when it is installed.
+
+import json
+
+from numpy import pi, zeros, cos, sin, linspace, asarray, multiply, full, log2, exp2, rint, isnan, where, nonzero
+from numpy import eye, poly, atleast_1d, trim_zeros, vstack
+from numpy.linalg import solve
+
+# discretized (num, den) of every design calculated so far, keyed by (cutoff, sample frequency, degree).
+# shared by all filters so identical designs are only calculated once
+_coeff_cache = {}
+# whether designs have been calculated since the cache was last loaded or saved
+_cache_changed = False
+# where messages about new designs go. set to the program's printf to keep them w/ its output
+report = print
+
+# measured sample rates are snapped to this many steps per octave (about 9% apart) so drifting
+# loop rates only ever need a small grid of designs
+RATE_STEPS = 8
+# weight of each new interval in the measured sample interval
+RATE_SMOOTHING = .1
+
+
+def grid_rate(rate):
+    '''Snap a measured sample rate (Hz), or an array of them, to the grid of rates filters are designed for'''
+    return exp2(rint(log2(rate)*RATE_STEPS)/RATE_STEPS)
+
+
+def load_coefficients(path) -> int:
+    '''Load designs saved by save_coefficients so they are not recalculated.
+    Returns the number of designs loaded, 0 if the file is missing or unreadable'''
+    global _cache_changed
+    try:
+        with open(path, 'r') as f:
+            rows = json.load(f)
+        for cutoff, sf, n, num, den in rows:
+            _coeff_cache[(cutoff, sf, n)] = (asarray(num), asarray(den))
+    except (OSError, ValueError, TypeError):
+        return 0
+    _cache_changed = False
+    return len(rows)
 
-from numpy import pi, zeros, cos, sin, linspace
-from scipy.signal import TransferFunction
+
+def save_coefficients(path, force=False):
+    '''Save every design calculated so far to a JSON file. Skipped if there are no new designs
+    unless force is True'''
+    global _cache_changed
+    if not (_cache_changed or force):
+        return
+    rows = [[cutoff, sf, n, [float(c) for c in num], [float(c) for c in den]]
+        for (cutoff, sf, n), (num, den) in _coeff_cache.items()]
+    with open(path, 'w') as f:
+        json.dump(rows, f)
+    _cache_changed = False
+
+
+def _normalize(num, den):
+    # scale so den[0] is 1 and drop the leading zeros, same as scipy.signal.normalize
+    den = trim_zeros(atleast_1d(asarray(den, dtype=float)), 'f')
+    num = atleast_1d(asarray(num, dtype=float)) / den[0]
+    den = den / den[0]
+    lead = 0
+    while (lead < len(num) - 1) and (abs(num[lead]) <= 1e-14):
+        lead += 1
+    return num[lead:], den
+
+
+def bilinear(num, den, dt) -> tuple:
+    '''Discretize the analog transfer function num(s)/den(s) w/ the bilinear (Tustin) transform
+    for a sample period of dt seconds. Gives the (num, den) of the discrete transfer function.
+    Goes through the controller canonical state space like scipy's cont2discrete(method='bilinear')
+    so the coefficients match it.'''
+    num, den = _normalize(num, den)
+    k = len(den)
+    if len(num) > k:
+        raise ValueError("Improper transfer function. num is longer than den.")
+    num = asarray([0.0]*(k - len(num)) + list(num))
+    # state space of the analog system
+    if k == 1:
+        a = zeros((1, 1))
+        b = zeros((1, 1))
+        c = zeros((1, 1))
+    else:
+        a = vstack((-den[1:], eye(k - 2, k - 1)))
+        b = eye(k - 1, 1)
+        c = (num[1:] - num[0]*den[1:]).reshape(1, k - 1)
+    d = num[0]
+    # bilinear transform of the state space
+    ima = eye(len(a)) - .5*dt*a
+    ad = solve(ima, eye(len(a)) + .5*dt*a)
+    bd = solve(ima, dt*b)
+    cd = solve(ima.T, c.T).T
+    dd = d + .5*(c @ bd)[0, 0]
+    # back to a transfer function
+    den_d = poly(ad)
+    num_d = poly(ad - bd @ cd) + (dd - 1)*den_d
+    return _normalize(num_d, den_d)
 
 
 class LowPassFilter(object):
     '''Creates a low pass filter on initialization for different sensors.
-    Use filter(sensor_value) to utilize the low pass filter.
+    Use filter(sensor_value) to utilize the low pass filter, or filter_batch(values)
+    to filter a whole array of recorded values at once. filter_at(sensor_value, time)
+    measures the actual sample rate and redesigns the filter when the rate drifts.
     recalc() will allow you to modify your instance of the filter. '''
+    # fixed attributes so each filter is small and attribute lookups are fast
+    __slots__ = ('wc', 'fc', 'sf', 'n', 'num', 'den', '_b', '_a', '_m', '_z', '_t', '_dt')
 
     # will want to fine tune sample frequency default value depending on loop time of program
     def __init__(self, cutoff, sample_frequency=500, degree=2):
         self.wc = 2*pi*cutoff  # cutoff frequency (rad/s)
         self.sf = sample_frequency
         self.n = degree
+        self._z = []
+        self._t = None  # time of the last sample given to filter_at
+        self._dt = None  # smoothed interval between samples given to filter_at
         self.recalc(self.sf, cutoff)
 
     def __fil_coeff(self):
@@ -44,43 +148,231 @@ class LowPassFilter(object):
     
     def __discretization(self, B):
         denom = B
-        lowPass = TransferFunction(1, denom)
         dt = 1.0/self.sf
-        discreteLowPass = lowPass.to_discrete(dt, method='gbt', alpha=0.5)
-        self.num = discreteLowPass.num
-        self.den = -discreteLowPass.den
+        self.num, den = bilinear(1, denom, dt)
+        self.den = -den
     
     def recalc(self, sampling_freq, cutoff):
         '''Calculate the discretized coefficients by providing
-         a new sampling frequency and cutoff frequency'''
+         a new sampling frequency and cutoff frequency. Designs that
+         were already calculated are taken from the cache.'''
+        global _cache_changed
         self.sf = sampling_freq
+        self.fc = cutoff
         self.wc = 2*pi*cutoff  # cutoff frequency (rad/s)
-        self.__discretization(self.__fil_coeff())
-        print("Coefficients calculated!")
+        key = (float(cutoff), float(sampling_freq), int(self.n))
+        try:
+            self.num, self.den = _coeff_cache[key]
+        except KeyError:
+            self.__discretization(self.__fil_coeff())
+            _coeff_cache[key] = (self.num, self.den)
+            _cache_changed = True
+            report(f"Coefficients calculated for {cutoff} Hz at {sampling_freq:.2f} Hz")
+        self._load_coefficients()
+
+    def _load_coefficients(self):
+        # copy num and den to float tuples for the filter. den is stored negated
+        m = min(self.n, len(self.num) - 1, len(self.den) - 1)
+        self._b = tuple(float(c) for c in self.num[:m+1])
+        self._a = tuple(-float(c) for c in self.den[:m+1])
+        self._m = m
+        # keep the prior state across a recalc if the order did not change
+        if len(self._z) != m:
+            self._z = [0.0]*m
 
     def filter(self, s_val):
         '''Pass in your new sensor value to return the next filtered value.'''
-        Nb = len(self.num)
-        # check if we have prior values to pass into filter
+        # transposed direct form II: state z is updated in place so nothing new is allocated
+        z = self._z
+        m = self._m
+        if m == 1:
+            b0, b1 = self._b
+            a1 = self._a[1]
+            filt_new = b0*s_val + z[0]
+            z[0] = b1*s_val - a1*filt_new
+        elif m == 2:
+            b0, b1, b2 = self._b
+            _, a1, a2 = self._a
+            filt_new = b0*s_val + z[0]
+            z[0] = b1*s_val - a1*filt_new + z[1]
+            z[1] = b2*s_val - a2*filt_new
+        elif m == 0:
+            filt_new = self._b[0]*s_val
+        else:
+            b = self._b
+            a = self._a
+            filt_new = b[0]*s_val + z[0]
+            for i in range(1, m):
+                z[i-1] = b[i]*s_val - a[i]*filt_new + z[i]
+            z[m-1] = b[m]*s_val - a[m]*filt_new
+        return filt_new
+
+    def filter_at(self, s_val, t):
+        '''Pass in your new sensor value and the time (s) it was sampled to return the next
+        filtered value. The interval between samples is measured and, when the rate drifts to
+        another step of the rate grid, the filter is redesigned for it keeping its state.'''
+        last = self._t
+        self._t = t
+        if (last is not None) and (t > last):
+            dt = t - last
+            self._dt = dt if self._dt is None else self._dt + RATE_SMOOTHING*(dt - self._dt)
+            rate = float(grid_rate(1/self._dt))
+            if rate != self.sf:
+                self.recalc(rate, self.fc)
+        return self.filter(s_val)
+
+    def filter_batch(self, s_vals):
+        '''Pass in an array of sensor values to get the array of filtered values.
+        Continues from the prior values given to filter() or filter_batch() and leaves
+        the filter ready to continue from the last value, same as calling filter() on each.'''
+        s_vals = asarray(s_vals, dtype=float)
+        if len(s_vals) == 0:
+            return s_vals
+        if self._m == 0:
+            return self._b[0] * s_vals
         try:
-            self.f_vals
-        except AttributeError:
-            self.f_vals = [0]*self.n
-            self.s_vals = [0]*self.n
-        
-        # use coeffs and prior discrete values to get new filtered value
-        filt_new = self.num[0]*s_val
-        for f, y, a, b in zip(reversed(self.f_vals), reversed(self.s_vals), self.den[1:], self.num[1:]):
-            filt_new += a*f + b*y
-    
-        # maintain list length n-long
-        self.f_vals.append(filt_new)
-        self.s_vals.append(s_val)
-        self.f_vals.pop(0)
-        self.s_vals.pop(0)
+            # only imported here as scipy.signal is slow to import on the Pi
+            from scipy.signal import lfilter
+        except ImportError:
+            return asarray([self.filter(x) for x in s_vals.tolist()])
+        # the filter state is the same as the initial conditions lfilter takes
+        filt_vals, zf = lfilter(self._b, self._a, s_vals, zi=asarray(self._z))
+        self._z[:] = zf.tolist()
+        return filt_vals
+
+
+class FilterBank(object):
+    '''Low pass filters for several sensor channels stepped together. Each channel has its own
+    cutoff frequency, and the coefficients and state of every channel are kept in 2-D arrays
+    (one row per channel) so step(values) filters all channels in one vectorized update.
+    Gives the same output as a LowPassFilter per channel. Given the time of each step,
+    every channel tracks its own sample rate like LowPassFilter.filter_at, and a mask
+    leaves channels w/o a new reading untouched for that step.'''
+
+    def __init__(self, cutoffs, sample_frequency=500, degree=2, names=None):
+        self.names = tuple(names) if names is not None else tuple(range(len(cutoffs)))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.sf = sample_frequency
+        self.n = degree
+        self.cutoffs = list(cutoffs)
+        self.z = zeros((len(self.cutoffs), 0))
+        # last filtered value of each channel. NaN until the channel is first stepped
+        self.y = full(len(self.cutoffs), float('nan'))
+        self._t = full(len(self.cutoffs), float('nan'))  # time each channel was last stepped
+        self._dt = full(len(self.cutoffs), float('nan'))  # smoothed interval of each channel
+        self.recalc(sample_frequency)
+
+    def recalc(self, sampling_freq, cutoffs=None):
+        '''Calculate the coefficients of every channel for a new sampling frequency and
+        optionally new cutoff frequencies. Designs are shared w/ LowPassFilter's cache.'''
+        self.sf = sampling_freq
+        if cutoffs is not None:
+            self.cutoffs = list(cutoffs)
+        self.rates = full(len(self.cutoffs), float(sampling_freq))  # design rate of each channel
+        self._build()
+
+    def _build(self):
+        filters = [LowPassFilter(cutoff, rate, self.n) for cutoff, rate in zip(self.cutoffs, self.rates)]
+        m = max(f._m for f in filters)
+        c = len(filters)
+        # pad lower order channels w/ zero coefficients so every row has the same length
+        self.b = zeros((c, m + 1))
+        self.a = zeros((c, m + 1))
+        for i, f in enumerate(filters):
+            self.b[i, :f._m + 1] = f._b
+            self.a[i, :f._m + 1] = f._a
+        self.m = m
+        # contiguous copies used by step so no slicing is done per sample
+        self._b0 = self.b[:, 0].copy()
+        self._bk = self.b[:, 1:].copy()
+        self._ak = self.a[:, 1:].copy()
+        self._next_z = zeros((c, m))
+        self._ay = zeros((c, m))
+        # keep the prior state if the order did not change
+        if self.z.shape != (c, m):
+            self.z = zeros((c, m))
+        if len(self.y) != c:
+            self.y = full(c, float('nan'))
+
+    def _redesign(self, i, rate):
+        # design channel i for a new sample rate, keeping its state
+        self.rates[i] = rate
+        f = LowPassFilter(self.cutoffs[i], rate, self.n)
+        if f._m > self.m:
+            self._build()
+            return
+        for coeffs, new in ((self.b, f._b), (self.a, f._a)):
+            coeffs[i] = 0.0
+            coeffs[i, :f._m + 1] = new
+        self.z[i, f._m:] = 0.0
+        self._b0[i] = self.b[i, 0]
+        self._bk[i] = self.b[i, 1:]
+        self._ak[i] = self.a[i, 1:]
+
+    def _track(self, t, mask):
+        # measure the interval of each stepped channel and redesign the ones that drifted
+        dt = t - self._t
+        new = dt > 0  # False for the first step of a channel (NaN)
+        if mask is not None:
+            new &= mask
+            self._t[mask] = t
+        else:
+            self._t[:] = t
+        if not new.any():
+            return
+        old = self._dt[new]
+        self._dt[new] = where(isnan(old), dt[new], old + RATE_SMOOTHING*(dt[new] - old))
+        rates = grid_rate(1/self._dt[new])
+        for i, rate in zip(nonzero(new)[0], rates):
+            if rate != self.rates[i]:
+                self._redesign(i, float(rate))
+
+    def step(self, s_vals, t=None, mask=None):
+        '''Pass in the new value of every channel, in order, to get the array of filtered values.
+        Give the time (s) of the step to track the sample rate of each channel. Channels that
+        are False in mask are not stepped and keep their last filtered value.'''
+        x = asarray(s_vals, dtype=float)
+        if mask is not None:
+            mask = asarray(mask, dtype=bool)
+        if t is not None:
+            self._track(t, mask)
+        y = self._b0*x
+        if self.m:
+            z = self.z
+            next_z = self._next_z
+            y += z[:, 0]
+            # transposed direct form II for every channel at once
+            multiply(self._bk, x[:, None], out=next_z)
+            multiply(self._ak, y[:, None], out=self._ay)
+            next_z -= self._ay
+            next_z[:, :-1] += z[:, 1:]
+            if mask is not None:
+                next_z[~mask] = z[~mask]
+            # swap the state buffers instead of allocating a new one
+            self.z, self._next_z = next_z, z
+        if mask is not None:
+            y[~mask] = self.y[~mask]
+        self.y = y
+        return y
+
+    def filter_channel(self, channel, s_val) -> float:
+        '''Pass in a new value for one channel (by name) to return its next filtered value'''
+        i = self.index[channel]
+        b = self.b[i]
+        a = self.a[i]
+        z = self.z[i]
+        filt_new = b[0]*s_val + (z[0] if self.m else 0.0)
+        for k in range(1, self.m):
+            z[k-1] = b[k]*s_val - a[k]*filt_new + z[k]
+        if self.m:
+            z[self.m-1] = b[self.m]*s_val - a[self.m]*filt_new
+        self.y[i] = filt_new
+        return float(filt_new)
+
+    def __getitem__(self, channel) -> float:
+        '''Last filtered value of the channel'''
+        return float(self.y[self.index[channel]])
 
-        return filt_new
-        
 
 # run this to test 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+# butterworth/benchmark.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Compare the time per sample of LowPassFilter.filter against the list based version
+# it replaced, and FilterBank.step against one LowPassFilter per channel, and check that
+# each pair gives the same output. Also checks the numpy bilinear transform in b_filter
+# against scipy's.
+# Run from the repository root: python3 -m lib.butterworth.benchmark
+
+from timeit import timeit
+from math import pi
+from random import random
+
+from scipy.signal import butter, TransferFunction
+
+from lib.butterworth.b_filter import LowPassFilter, FilterBank, bilinear
+
+
+class ListFilter(object):
+    '''The prior version of LowPassFilter.filter, kept only for comparison'''
+
+    def __init__(self, num, den, degree=2):
+        self.num = num
+        self.den = den
+        self.n = degree
+
+    def filter(self, s_val):
+        Nb = len(self.num)
+        # check if we have prior values to pass into filter
+        try:
+            self.f_vals
+        except AttributeError:
+            self.f_vals = [0]*self.n
+            self.s_vals = [0]*self.n
+
+        # use coeffs and prior discrete values to get new filtered value
+        filt_new = self.num[0]*s_val
+        for f, y, a, b in zip(reversed(self.f_vals), reversed(self.s_vals), self.den[1:], self.num[1:]):
+            filt_new += a*f + b*y
+
+        # maintain list length n-long
+        self.f_vals.append(filt_new)
+        self.s_vals.append(s_val)
+        self.f_vals.pop(0)
+        self.s_vals.pop(0)
+
+        return filt_new
+
+
+def compare(name, new, old, samples):
+    '''Print the time per sample of each filter and the largest difference in output'''
+    n = len(samples)
+    diff = max(abs(new.filter(x) - old.filter(x)) for x in samples)
+    t_new = timeit(lambda: [new.filter(x) for x in samples], number=5) / (5*n)
+    t_old = timeit(lambda: [old.filter(x) for x in samples], number=5) / (5*n)
+    print(f"{name:<28} old {t_old*1e9:7.0f} ns  new {t_new*1e9:7.0f} ns  "
+        f"speedup {t_old/t_new:4.1f}x  max diff {diff:.1e}")
+
+
+def compare_bank(channels, samples):
+    '''Print the time per step of a FilterBank against a LowPassFilter per channel'''
+    cutoffs = [5 + k for k in range(channels)]
+    bank = FilterBank(cutoffs)
+    single = [LowPassFilter(c) for c in cutoffs]
+    rows = [[x]*channels for x in samples]
+    diff = max(abs(y - f.filter(x)) for row in rows for y, f, x in zip(bank.step(row), single, row))
+    n = len(rows)
+    t_bank = timeit(lambda: [bank.step(row) for row in rows], number=5) / (5*n)
+    t_single = timeit(lambda: [[f.filter(x) for f, x in zip(single, row)] for row in rows], number=5) / (5*n)
+    print(f"{channels:>3} channels{'':<17} single {t_single*1e6:6.1f} us  bank {t_bank*1e6:6.1f} us  "
+        f"speedup {t_single/t_bank:4.1f}x  max diff {diff:.1e}")
+
+
+def check_bilinear(name, num, den, sf):
+    '''Print the largest difference between the numpy and scipy bilinear transforms'''
+    ref = TransferFunction(num, den).to_discrete(1/sf, method='gbt', alpha=0.5)
+    b, a = bilinear(num, den, 1/sf)
+    diff = max(max(abs(b - ref.num)), max(abs(a - ref.den)))
+    print(f"{name:<28} bilinear max diff {diff:.1e}")
+
+
+if __name__ == "__main__":
+    # the analog designs the sensors use and a full 2nd order butterworth
+    check_bilinear("sensor design (200 Hz)", 1, [0, 0, 1], 500)
+    wc = 2*pi*5
+    check_bilinear("2nd order butterworth (5 Hz)", 1, [1/wc**2, 2**.5/wc, 1], 500)
+
+    samples = [random() for _ in range(20000)]
+
+    # design used by the sensors
+    new = LowPassFilter(200)
+    old = ListFilter(new.num, new.den)
+    compare("sensor design (200 Hz)", new, old, samples)
+
+    # full 2nd order butterworth
+    b, a = butter(2, 5 / (500 / 2))
+    new.num, new.den = b, -a
+    new._load_coefficients()
+    old = ListFilter(b, -a)
+    compare("2nd order butterworth (5 Hz)", new, old, samples)
+
+    # several channels stepped together
+    for channels in (4, 16, 64):
+        compare_bank(channels, samples[:5000])
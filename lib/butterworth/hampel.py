@@ -0,0 +1,85 @@
+# butterworth/hampel.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Reject outliers and sensor dropouts before the values reach the low pass filters.
+# A Hampel filter compares each new value to the median of the last few values and
+# replaces the ones too far from it w/ the median.
+
+from bisect import bisect_left, insort
+from collections import deque
+
+
+class SortedWindow(object):
+    '''The last `size` values added, kept both in the order they came in and in sorted order
+    so the median and quantiles can be read without sorting. Finding where a value goes is
+    O(log n) w/ bisect.'''
+    __slots__ = ('size', 'sorted', '_fifo')
+
+    def __init__(self, size):
+        self.size = size
+        self.sorted = []
+        self._fifo = deque()
+
+    def __len__(self):
+        return len(self._fifo)
+
+    def add(self, x):
+        '''Add a value, dropping the oldest once the window is full'''
+        if len(self._fifo) == self.size:
+            old = self._fifo.popleft()
+            del self.sorted[bisect_left(self.sorted, old)]
+        self._fifo.append(x)
+        insort(self.sorted, x)
+
+    def clear(self):
+        self.sorted.clear()
+        self._fifo.clear()
+
+    def quantile(self, q) -> float:
+        '''Gives the q quantile (0 to 1) of the values in the window, interpolating between values'''
+        s = self.sorted
+        pos = q*(len(s) - 1)
+        i = int(pos)
+        if i + 1 >= len(s):
+            return s[-1]
+        return s[i] + (pos - i)*(s[i+1] - s[i])
+
+    def median(self) -> float:
+        '''Gives the median of the values in the window'''
+        s = self.sorted
+        half = len(s) // 2
+        return s[half] if len(s) % 2 else (s[half-1] + s[half])/2
+
+
+class HampelFilter(object):
+    '''Streaming Hampel filter. Use filter(sensor_value) before passing the value to a low pass filter.
+    A value more than k times the spread of the window away from the window's median is replaced
+    by the median. The spread is estimated from the interquartile range (IQR/1.349 is the
+    standard deviation of normal noise) and is never taken as less than min_scale.
+    Failed readings (None or NaN) give None so the low pass filter can skip them.
+    Every reading is added to the window, so a real step change passes once it fills half of it.'''
+    __slots__ = ('window', 'k', 'min_scale', 'min_count', 'rejected')
+
+    def __init__(self, size=15, k=3.0, min_scale=0.0, min_count=5):
+        self.window = SortedWindow(size)
+        self.k = k
+        self.min_scale = min_scale
+        # values passed through as is until the window has this many
+        self.min_count = min_count
+        self.rejected = 0  # number of values replaced by the median
+
+    def filter(self, s_val):
+        '''Pass in your new sensor value to get it back, or the median of the window if it is an outlier.
+        Gives None for a failed reading.'''
+        if (s_val is None) or (s_val != s_val):
+            return None
+        window = self.window
+        window.add(s_val)
+        if len(window) < self.min_count:
+            return s_val
+        med = window.median()
+        scale = max((window.quantile(.75) - window.quantile(.25))/1.349, self.min_scale)
+        if abs(s_val - med) > self.k*scale:
+            self.rejected += 1
+            return med
+        return s_val
@@ -5,11 +5,71 @@ sensor and a Raspberry Pi.  Imperial and Metric measurements are available"""
 # MIT License
 from __future__ import division
 
-from time import sleep, time
+from time import sleep, perf_counter
 from math import pi, sqrt, acos, asin
+from threading import Event
 import warnings
 import RPi.GPIO as GPIO
 
+from lib.butterworth.hampel import SortedWindow
+
+# longest the echo pulse can take. The sensor gives up after about 38 ms w/o an echo
+ECHO_TIMEOUT = 0.1
+
+
+class EchoTimer(object):
+    """Time the echo pulse from its rising and falling edges. RPi.GPIO calls
+    back on each edge of the echo pin from its own thread, where the edge is
+    timestamped, so nothing spins on GPIO.input while waiting for the echo.
+    The first edge after the last arm() is taken as the rise and the second as
+    the fall. The pin is not read in the callback since a short echo can be
+    over before the callback runs. An edge of an earlier ping that comes in
+    after arm() is still taken for this one, so leave time between pings for
+    old echoes to die out.
+
+    Use arm() right before each trigger pulse, then wait() for the pulse length.
+    close() when done to remove the edge detection.
+    """
+
+    def __init__(self, echo_pin):
+        self.echo_pin = echo_pin
+        self.rise = None
+        self.fall = None
+        self._done = Event()
+        GPIO.add_event_detect(echo_pin, GPIO.BOTH, callback=self._edge)
+
+    def _edge(self, channel):
+        t = perf_counter()
+        if self._done.is_set():
+            return
+        if self.rise is None:
+            self.rise = t
+        else:
+            self.fall = t
+            self._done.set()
+
+    def arm(self):
+        """Forget the edges of the last pulse"""
+        self.rise = None
+        self.fall = None
+        self._done.clear()
+
+    def wait(self, timeout=ECHO_TIMEOUT):
+        """Wait for the echo and return its length in seconds"""
+        if not self._done.wait(timeout):
+            raise SystemError("Echo pulse was not received")
+        return self.fall - self.rise
+
+    def close(self):
+        GPIO.remove_event_detect(self.echo_pin)
+
+
+def _trigger(trig_pin):
+    # 10 us pulse starts one measurement
+    GPIO.output(trig_pin, True)
+    sleep(0.00001)
+    GPIO.output(trig_pin, False)
+
 
 class Measurement(object):
     """Create a measurement using a HC-SR04 Ultrasonic Sensor connected to 
@@ -18,6 +78,16 @@ class Measurement(object):
     Metric values are used by default. For imperial values use
     unit='imperial'
     temperature=<Desired temperature in Fahrenheit>
+
+    The pins are set up on the first reading (or open()) and kept until
+    close(), so each reading only sends the trigger and times the echo.
+    Can be used as a context manager:
+
+    with sensor.Measurement(trig_pin, echo_pin) as value:
+        r = value.raw_distance()
+
+    For a reading that updates a little at a time instead of in bursts,
+    call stream_distance() once per time slot. Each call sends one ping.
     """
 
     def __init__(
@@ -29,6 +99,36 @@ class Measurement(object):
         self.unit = unit
         self.gpio_mode = gpio_mode
         self.pi = pi
+        self._echo = None  # EchoTimer while the pins are set up
+        self._window = None  # SortedWindow of the pings used by stream_distance
+
+    def open(self):
+        """Set up the pins for this sensor. Done once for the life of the instance"""
+        if self._echo is not None:
+            return
+        GPIO.setwarnings(False)
+        GPIO.setmode(self.gpio_mode)
+        GPIO.setup(self.trig_pin, GPIO.OUT)
+        GPIO.setup(self.echo_pin, GPIO.IN)
+        GPIO.output(self.trig_pin, GPIO.LOW)
+        self._echo = EchoTimer(self.echo_pin)
+
+    def close(self):
+        """Release the pins. The next reading sets them up again"""
+        if self._echo is None:
+            return
+        self._echo.close()
+        self._echo = None
+        # Only cleanup the pins used to prevent clobbering
+        # any others in use by the program
+        GPIO.cleanup((self.trig_pin, self.echo_pin))
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def raw_distance(self, sample_size=11, sample_wait=0.1):
         """Return an error corrected unrounded distance, in cm, of an object 
@@ -65,38 +165,48 @@ class Measurement(object):
 
         speed_of_sound = 331.3 * sqrt(1 + (self.temperature / 273.15))
         sample = []
-        # setup input/output pins
-        GPIO.setwarnings(False)
-        GPIO.setmode(self.gpio_mode)
-        GPIO.setup(self.trig_pin, GPIO.OUT)
-        GPIO.setup(self.echo_pin, GPIO.IN)
+        self.open()
+        echo = self._echo
 
         for distance_reading in range(sample_size):
-            GPIO.output(self.trig_pin, GPIO.LOW)
             sleep(sample_wait)
-            GPIO.output(self.trig_pin, True)
-            sleep(0.00001)
-            GPIO.output(self.trig_pin, False)
-            echo_status_counter = 1
-            while GPIO.input(self.echo_pin) == 0:
-                if echo_status_counter < 1000:
-                    sonar_signal_off = time()
-                    echo_status_counter += 1
-                else:
-                    raise SystemError("Echo pulse was not received")
-            n = 0
-            while (GPIO.input(self.echo_pin) == 1) and (n > 30):
-                sonar_signal_on = time()
-                n += 1
-            time_passed = sonar_signal_on - sonar_signal_off
+            echo.arm()
+            _trigger(self.trig_pin)
+            time_passed = echo.wait()
             distance_cm = time_passed * ((speed_of_sound * 100) / 2)
             sample.append(distance_cm)
         sorted_sample = sorted(sample)
-        # Only cleanup the pins used to prevent clobbering
-        # any others in use by the program
-        GPIO.cleanup((self.trig_pin, self.echo_pin))
         return sorted_sample[sample_size // 2]
 
+    def _speed_of_sound(self):
+        if self.unit == "imperial":
+            celsius = (self.temperature - 32) * 0.5556
+        elif self.unit == "metric":
+            celsius = self.temperature
+        else:
+            raise ValueError("Wrong Unit Type. Unit Must be imperial or metric")
+        return 331.3 * sqrt(1 + (celsius / 273.15))
+
+    def ping(self):
+        """Return the unrounded distance, in cm, of a single reading
+        adjusted for the temperature. Does not wait before the trigger,
+        so leave at least 60 ms between pings to let old echoes die out."""
+        self.open()
+        self._echo.arm()
+        _trigger(self.trig_pin)
+        return self._echo.wait() * ((self._speed_of_sound() * 100) / 2)
+
+    def stream_distance(self, window=11):
+        """Send one ping and return the median distance, in cm, of the
+        last `window` pings. The pings are kept sorted as they come in, so
+        each call costs one ping and a binary search instead of a burst
+        of pings and a sort. Failed pings raise SystemError and are left
+        out of the window."""
+        if (self._window is None) or (self._window.size != window):
+            self._window = SortedWindow(window)
+        self._window.add(self.ping())
+        return self._window.median()
+
     def depth(self, median_reading, hole_depth):
         """Calculate the depth of a liquid. hole_depth is the
         distance from the sensor to the bottom of the hole."""
@@ -190,20 +300,13 @@ class Measurement(object):
         GPIO.setup(echo_pin, GPIO.IN)
         GPIO.output(trig_pin, GPIO.LOW)
         sleep(0.1)
-        GPIO.output(trig_pin, True)
-        sleep(0.00001)
-        GPIO.output(trig_pin, False)
-        echo_status_counter = 1
-        while GPIO.input(echo_pin) == 0:
-            if echo_status_counter < 1000:
-                sonar_signal_off = time()
-                echo_status_counter += 1
-            else:
-                raise SystemError("Echo pulse was not received")
-        while GPIO.input(echo_pin) == 1:
-            sonar_signal_on = time()
-
-        time_passed = sonar_signal_on - sonar_signal_off
+        echo = EchoTimer(echo_pin)
+        try:
+            echo.arm()
+            _trigger(trig_pin)
+            time_passed = echo.wait()
+        finally:
+            echo.close()
         return time_passed * ((speed_of_sound * 100) / 2)
 
     def depth_metric(self, median_reading, hole_depth):
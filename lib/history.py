@@ -0,0 +1,113 @@
+# history.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Keep a fixed amount of sensor history in memory: the raw samples of the last few minutes
+# and min/mean/max rollups per minute and per hour
+
+from array import array
+
+
+def _ring(size, code='d') -> array:
+    return array(code, bytes(array(code).itemsize * size))
+
+
+class Rollup(object):
+    '''Min, mean, and max of a channel over each period (s), keeping the last `size` periods
+    in preallocated arrays. The current period is added once the first sample of the next
+    period comes in. Samples that are NaN are skipped.'''
+
+    def __init__(self, period, size):
+        self.period = period
+        self.size = size
+        self.starts = _ring(size)
+        self.mins = _ring(size)
+        self.means = _ring(size)
+        self.maxs = _ring(size)
+        self._i = 0  # next index to write
+        self.n = 0  # number of periods saved
+        self._bucket = None
+        self._min = self._max = self._sum = 0.0
+        self._count = 0
+
+    def add(self, t, x):
+        '''Add a sample taken at time t'''
+        if x != x:
+            return
+        bucket = int(t // self.period)
+        if bucket != self._bucket:
+            self._close()
+            self._bucket = bucket
+            self._min = self._max = self._sum = x
+            self._count = 1
+            return
+        if x < self._min:
+            self._min = x
+        elif x > self._max:
+            self._max = x
+        self._sum += x
+        self._count += 1
+
+    def _close(self):
+        if not self._count:
+            return
+        i = self._i
+        self.starts[i] = self._bucket * self.period
+        self.mins[i] = self._min
+        self.means[i] = self._sum / self._count
+        self.maxs[i] = self._max
+        self._i = (i + 1) % self.size
+        self.n = min(self.n + 1, self.size)
+        self._count = 0
+
+    def rows(self) -> list:
+        '''Gives (start time, min, mean, max) of each saved period, oldest first'''
+        first = (self._i - self.n) % self.size
+        return [(self.starts[j], self.mins[j], self.means[j], self.maxs[j])
+            for j in ((first + k) % self.size for k in range(self.n))]
+
+
+class SensorHistory(object):
+    '''History of each channel held in fixed memory. Keeps the last raw_size raw samples,
+    minute rollups for the last `minutes` minutes, and hour rollups for the last `hours` hours.
+    Adding a sample is O(1) no matter how much history is kept.'''
+
+    def __init__(self, channels=('pH', 'EC', 'temp', 'level'), raw_size=6000, minutes=24*60, hours=30*24):
+        self.channels = tuple(channels)
+        self.raw_size = raw_size
+        self.times = _ring(raw_size)
+        self.raw = {ch: _ring(raw_size) for ch in self.channels}
+        self.by_minute = {ch: Rollup(60, minutes) for ch in self.channels}
+        self.by_hour = {ch: Rollup(60*60, hours) for ch in self.channels}
+        self._i = 0
+        self.n = 0
+
+    def add(self, t, values):
+        '''Add one sample of every channel, in the order of channels, taken at time t'''
+        i = self._i
+        self.times[i] = t
+        for ch, x in zip(self.channels, values):
+            self.raw[ch][i] = x
+            self.by_minute[ch].add(t, x)
+            self.by_hour[ch].add(t, x)
+        self._i = (i + 1) % self.raw_size
+        self.n = min(self.n + 1, self.raw_size)
+
+    def latest(self, ch) -> float:
+        '''Gives the last raw sample of the channel. None if nothing has been added'''
+        if not self.n:
+            return None
+        return self.raw[ch][(self._i - 1) % self.raw_size]
+
+    def recent(self, ch) -> list:
+        '''Gives (time, value) of each raw sample kept for the channel, oldest first'''
+        first = (self._i - self.n) % self.raw_size
+        raw = self.raw[ch]
+        return [(self.times[j], raw[j]) for j in ((first + k) % self.raw_size for k in range(self.n))]
+
+    def minutes(self, ch) -> list:
+        '''Gives (start time, min, mean, max) of each minute kept for the channel, oldest first'''
+        return self.by_minute[ch].rows()
+
+    def hours(self, ch) -> list:
+        '''Gives (start time, min, mean, max) of each hour kept for the channel, oldest first'''
+        return self.by_hour[ch].rows()
@@ -0,0 +1,95 @@
+# log_sink.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Buffer output meant for the log file in memory and write it from a background thread
+# so each message does not open and close the file on the SD card
+
+import atexit
+import threading
+
+
+class LogSink(object):
+    '''Collects messages in memory and appends them to the file at path from a background
+    thread. The buffer is written once it holds flush_size characters, every flush_time
+    seconds, and when the program exits. Use get_sink to share one sink per file.'''
+
+    def __init__(self, path, flush_size=8192, flush_time=5):
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_time = flush_time
+        self._buf = []
+        self._size = 0
+        self._f = None
+        self._closed = False
+        # _lock guards the buffer, _write_lock the file. _write_lock is always taken first and
+        # held from taking the buffer to writing it, so batches reach the file in order
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f'log sink {path}', daemon=True)
+        self._thread.start()
+
+    def write(self, msgs, terminal=False):
+        '''Queue a message, or each message in a list, to be saved as one line. Also print
+        to the terminal if terminal is True'''
+        if (type(msgs) is str) or (not hasattr(msgs, '__iter__')):
+            msgs = [msgs]
+        text = ''.join(f'{msg}\n' for msg in msgs)
+        with self._lock:
+            self._buf.append(text)
+            self._size += len(text)
+            full = self._size >= self.flush_size
+        if terminal:
+            print(text, end='')
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        '''Write everything buffered so far to the file'''
+        with self._write_lock:
+            with self._lock:
+                buf = self._buf
+                self._buf = []
+                self._size = 0
+            if not buf:
+                return
+            if self._f is None:
+                self._f = open(self.path, 'a')
+            self._f.write(''.join(buf))
+            self._f.flush()
+
+    def close(self):
+        '''Write out the buffer and stop the background thread'''
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_time)
+            self._wake.clear()
+            try:
+                self.flush()
+            except OSError as e:
+                print(f'Could not write to {self.path}: {e}')
+
+
+# one sink per file so every state machine shares the same buffer and thread
+_sinks = {}
+
+
+def get_sink(path) -> LogSink:
+    '''Gives the sink for the file at path, creating it the first time'''
+    try:
+        return _sinks[path]
+    except KeyError:
+        sink = _sinks[path] = LogSink(path)
+        atexit.register(sink.close)
+        return sink
@@ -0,0 +1,64 @@
+# loop_stats.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Time each stage of the control loop to find what is slowing the loop down
+
+from array import array
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+
+class LoopStats(object):
+    '''Keeps the run times of the last `size` calls of each stage of the control loop
+    in fixed memory. Use stage(name) as a context manager around the code to time, then
+    percentiles(name) or report() to get the p50/p95/p99/max of the recent calls.'''
+
+    def __init__(self, size=500):
+        self.size = size
+        # stage name: [run times (ns), next index, number of calls]
+        self._stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        '''Time the code run inside the with block as one call of the stage'''
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, perf_counter_ns() - start)
+
+    def add(self, name, ns):
+        '''Record a run time in nanoseconds for the stage, writing over the oldest one once full'''
+        try:
+            entry = self._stages[name]
+        except KeyError:
+            entry = self._stages[name] = [array('q', bytes(8 * self.size)), 0, 0]
+        entry[0][entry[1]] = ns
+        entry[1] = (entry[1] + 1) % self.size
+        entry[2] += 1
+
+    def percentiles(self, name) -> dict:
+        '''Gives the p50, p95, p99, and max run times (ms) of the recent calls of the stage
+        along with the total number of calls. None if the stage has not been timed'''
+        try:
+            times, _, calls = self._stages[name]
+        except KeyError:
+            return None
+        recent = sorted(times[:min(calls, self.size)])
+        last = len(recent) - 1
+
+        def pick(p):
+            return recent[round(p * last)] / 1e6
+        return {'p50': pick(.5), 'p95': pick(.95), 'p99': pick(.99), 'max': recent[-1] / 1e6, 'n': calls}
+
+    def report(self) -> list:
+        '''Gives a line of formatted run times for each stage'''
+        lines = [f"{'stage':<20} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'calls':>8}"]
+        for name in self._stages:
+            p = self.percentiles(name)
+            lines.append(f"{name:<20} {p['p50']:8.3f} {p['p95']:8.3f} {p['p99']:8.3f} {p['max']:8.3f} {p['n']:8d}")
+        return lines
+
+    def reset(self):
+        '''Forget all recorded run times'''
+        self._stages = {}
@@ -0,0 +1,80 @@
+# reservoir.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Convert the water depth in the reservoir to the volume of water w/ a table calibrated
+# for the tank, instead of a formula for an ideal shape
+
+from csv import reader, writer
+
+from numpy import asarray, interp, argsort, maximum, concatenate, cumsum, diff
+
+LITERS_PER_GALLON = 3.78541
+
+
+class ReservoirTable(object):
+    '''Volume of water (L) at each depth (cm) measured from the bottom of the reservoir.
+    Build it once from a fill calibration (from_fill), a tank profile (from_profile), or
+    the straight sided default (straight), save() it, and load() it on the next start.
+    volume() interpolates between the points of the table, for one depth or an array of them.
+    placeholder marks a table that was assumed instead of calibrated for the tank.'''
+
+    def __init__(self, depths, volumes, placeholder=False):
+        depths = asarray(depths, dtype=float)
+        volumes = asarray(volumes, dtype=float)
+        if (depths.ndim != 1) or (len(depths) != len(volumes)) or (len(depths) < 2):
+            raise ValueError("A reservoir table needs at least 2 depths w/ a volume for each")
+        order = argsort(depths)
+        self.depths = depths[order]
+        # water can only be added going up, so smooth out calibration noise that says otherwise
+        self.volumes = maximum.accumulate(volumes[order])
+        self.placeholder = placeholder
+
+    @classmethod
+    def from_fill(cls, points):
+        '''Table from a fill calibration: (depth cm, volume L) pairs recorded while filling the tank'''
+        depths, volumes = zip(*points)
+        return cls(depths, volumes)
+
+    @classmethod
+    def from_profile(cls, depths, areas):
+        '''Table from the tank's profile: the area (cm^2) of the water surface at each depth (cm)'''
+        depths = asarray(depths, dtype=float)
+        areas = asarray(areas, dtype=float)
+        # trapezoid rule between the depths of the profile. 1 L = 1000 cm^3
+        slices = (areas[1:] + areas[:-1]) / 2 * diff(depths) / 1000
+        return cls(depths, concatenate(([0.0], cumsum(slices))))
+
+    @classmethod
+    def straight(cls, volume, height, placeholder=False):
+        '''Table for a straight sided tank holding volume (L) when filled to height (cm)'''
+        return cls((0.0, height), (0.0, volume), placeholder)
+
+    @classmethod
+    def load(cls, path):
+        '''Load a table saved by save(). Raises OSError if the file cannot be read, ValueError if it is not a table'''
+        with open(path, 'r', newline='') as f:
+            rows = [row for row in reader(f) if row]
+        return cls.from_fill((float(d), float(v)) for d, v in rows[1:])
+
+    def save(self, path):
+        '''Save the table as a CSV of depth (cm) and volume (L)'''
+        with open(path, 'w', newline='') as f:
+            w = writer(f)
+            w.writerow(('depth_cm', 'volume_L'))
+            w.writerows(zip(self.depths.tolist(), self.volumes.tolist()))
+
+    def volume(self, depth):
+        '''Volume of water (L) at the depth (cm), or an array of volumes for an array of depths.
+        Depths outside of the table are given the volume at its closest end.'''
+        v = interp(depth, self.depths, self.volumes)
+        return float(v) if v.ndim == 0 else v
+
+    def depth(self, volume):
+        '''Depth of water (cm) holding the volume (L). The inverse of volume()'''
+        d = interp(volume, self.volumes, self.depths)
+        return float(d) if d.ndim == 0 else d
+
+    @property
+    def capacity(self) -> float:
+        '''Volume (L) at the top of the table'''
+        return float(self.volumes[-1])
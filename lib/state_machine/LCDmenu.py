@@ -15,20 +15,96 @@
 from time import time
 from csv import reader, writer
 from warnings import warn
+from heapq import heappush, heappop
 
 from lib.lcd.lcd import CursorMode
+from lib.log_sink import get_sink
+
+
+class timer_queue():
+    '''Min-heap of the end times of every timer with a callback. Lets the program sleep until the next
+    timer runs out and only handle the timers that are due instead of checking each timer in turn.
+    Entries left behind when a timer is reset or stopped are dropped once they reach the top.'''
+
+    def __init__(self):
+        self._heap = []
+        self._n = 0  # breaks ties between equal end times
+        # called when a timer is pushed that runs out before every other timer, so whatever
+        # is sleeping until the next timer can wake up early
+        self.on_sooner = None
+
+    def push(self, t):
+        '''Add the current end time of a timer to the queue'''
+        head = self.next_deadline()
+        heappush(self._heap, (t.timer_time, self._n, t))
+        self._n += 1
+        if (self.on_sooner is not None) and ((head is None) or (t.timer_time < head)):
+            self.on_sooner()
+
+    def _drop_stale(self):
+        # remove entries for timers that were stopped or set to a new end time since being pushed
+        while self._heap:
+            end_time, _, t = self._heap[0]
+            if (t.timer_time == end_time) and (t.callback is not None):
+                break
+            heappop(self._heap)
+
+    def next_deadline(self) -> float:
+        '''Gives the end time of the next timer to run out. None if no timers are set'''
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def time_until_next(self, default=None) -> float:
+        '''Gives the seconds until the next timer runs out, or default if no timers are set'''
+        end_time = self.next_deadline()
+        if end_time is None:
+            return default
+        return max(end_time - time(), 0)
+
+    def run_expired(self, now=None) -> int:
+        '''Turns off each timer that has run out and calls its callback. Returns the number of timers run'''
+        now = time() if now is None else now
+        n = 0
+        while True:
+            self._drop_stale()
+            if (not self._heap) or (self._heap[0][0] > now):
+                return n
+            _, _, t = heappop(self._heap)
+            # same as timer_event so the callback can set the timer again
+            t.timer_time = None
+            t.callback()
+            n += 1
+
+
+# shared by every timer unless told otherwise
+timers = timer_queue()
+
 
 class timer():
     '''Creates a nonblocking timer to trigger a timer event when checked. Use timer_set to start the timer.
-    Changing TIMER_INTERVAL does not update the new end time of the timer. '''
+    Changing TIMER_INTERVAL does not update the new end time of the timer. Pass in a callback to have the
+    timer queue run it when the timer runs out instead of checking timer_event. '''
     timer_time = None
 
-    def __init__(self, interval):
+    def __init__(self, interval, callback=None, queue=timers):
         try:
             self.TIMER_INTERVAL = float(interval)
         except ValueError as e:
             warn(f'Invalid timer input: {e}\nSetting interval to None')
             self.TIMER_INTERVAL = None
+        self.queue = queue
+        self.callback = None
+        self.set_callback(callback)
+
+    def set_callback(self, callback):
+        '''Function to call when the timer runs out. None to go back to checking timer_event'''
+        self.callback = callback
+        self._queue_push()
+
+    def _queue_push(self):
+        # only timers with a callback need to be tracked by the queue
+        if (self.callback is not None) and (self.timer_time is not None) and (self.queue is not None):
+            self.queue.push(self)
 
     def timer_event(self) -> bool:
         '''Checks to see if the time has passed. If it has, turns off timer and returns True. If the timer was not set,
@@ -63,6 +139,7 @@ class timer():
                 self.timer_time = None
             else:
                 pass
+        self._queue_push()
 
     def time_remaining(self) -> float:
         '''Checks to see if the time has passed. If it not, returns float of difference. No reset if time has passed'''
@@ -82,6 +159,7 @@ class timer():
                 self.timer_set()
             else:
                 self.timer_time += new_interval - self.TIMER_INTERVAL
+                self._queue_push()
         else: 
             self.timer_time = None
         self.TIMER_INTERVAL = new_interval
@@ -110,6 +188,10 @@ class menu():
     ECH = 2  # high EC threshhold
     ECL = 0.01  # low EC threshhold
     sT = 65  # sonar threshold
+    # names of the settings as saved in Settings.csv
+    setting_names = ('Flood Timer', 'Active Pump Timer', 'Empty Timer', 'Max water level',
+        'pH High Threshold', 'pH Low Threshold', 'EC High Threshold', 'EC Low Threshold',
+        'Pump cycle stage', 'Cycle time remaining')
     # to help track program cycle between power shutoff
     __cycleIndex = 0
     __cycleTime = ap
@@ -118,6 +200,8 @@ class menu():
     idle_timer.timer_set()
     idle_printer = timer(5)
     _idle_n = 0
+    # optional storage.ShrubStore to save settings changes to
+    store = None
 
     def __init__(self, LCD, shrub, conditioner, test=False, output=None):
         self.state = self.start
@@ -127,6 +211,7 @@ class menu():
 
         self.test = test
         self.output_file = output
+        self.log = get_sink(output) if output is not None else None
 
         # check to see if state machine settings exist. if not create w/ default settings
         try:
@@ -180,18 +265,8 @@ class menu():
 
     def printf(self, msgs, terminal=False):
         '''Save output to terminal to text file'''
-        if self.output_file is not None:
-            if type(msgs) is str:
-                with open(self.output_file, 'a') as f:
-                    print(msgs, file=f)
-                if terminal:
-                    print(msgs)
-            else:
-                for msg in msgs:
-                    with open(self.output_file, 'a') as f:
-                        print(msg, file=f)
-                    if terminal:
-                        print(msg)
+        if self.log is not None:
+            self.log.write(msgs, terminal)
         else:
             print(msgs)
 
@@ -215,22 +290,14 @@ class menu():
                 raise LookupError("Invalid parent setting to save")
 
             self.settings[i] = self.param2change
+            if self.store is not None:
+                self.store.setting(self.setting_names[i], self.param2change)
         # if cycle, check cycle state of shrub and save to file
         else:
             self.settings[8], self.settings[9] = self.getCycle()
 
         with open(r"Settings.csv", 'w') as f:
-            rows = [['Flood Timer', self.settings[0]], 
-                ['Active Pump Timer', self.settings[1]],
-                ['Empty Timer', self.settings[2]],  
-                ['Max water level', self.settings[3]],
-                ['pH High Threshold', self.settings[4]], 
-                ['pH Low Threshold', self.settings[5]], 
-                ['EC High Threshold', self.settings[6]], 
-                ['EC Low Threshold', self.settings[7]],
-                ['Pump cycle stage', self.settings[8]],
-                ['Cycle time remaining', self.settings[9]],
-            ] 
+            rows = [[name, value] for name, value in zip(self.setting_names, self.settings)]
             new_settings = writer(f)
             new_settings.writerows(rows)
 
@@ -0,0 +1,67 @@
+# state_machine/button_queue.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Queue the button presses given by the gpiozero edge callbacks so the main program
+# does not have to check each button for input
+
+from queue import SimpleQueue, Empty
+from collections import deque
+from time import monotonic
+
+
+class button_queue():
+    '''Thread-safe queue of button presses for the menu. Buttons added with add_button queue
+    their name from the gpiozero callback thread whenever they are pressed, and again every
+    hold_time while held if the button repeats, and get_event takes the next press off the queue.
+    Pressing a chord button while the other one is down gives chord_evt. Only then does get_event
+    wait up to chord_time for the other button's press, so it is not also given on its own.'''
+
+    def __init__(self, chord=('A_B', 'B_B'), chord_evt='TEST', chord_time=.15):
+        self._q = SimpleQueue()
+        # presses taken off the queue while waiting to see if a chord was pressed
+        self._held = deque()
+        # gpiozero button of each name, to check if the other chord button is down
+        self._buttons = {}
+        self.chord = chord
+        self.chord_evt = chord_evt
+        self.chord_time = chord_time
+
+    def add_button(self, name, button):
+        '''Queue name every time the gpiozero button is pressed, and every hold_time while it is
+        held if the button was made w/ hold_repeat=True'''
+        self._buttons[name] = button
+        button.when_pressed = lambda: self.put(name)
+        button.when_held = lambda: self.put(name)
+
+    def put(self, name, stamp=None):
+        '''Queue a press. Safe to call from any thread'''
+        self._q.put((name, monotonic() if stamp is None else stamp))
+
+    def _get(self, timeout):
+        if self._held:
+            return self._held.popleft()
+        if timeout is None:
+            return self._q.get()
+        return self._q.get(timeout=max(timeout, 0))
+
+    def get_event(self, timeout=None):
+        '''Gives the name of the next button pressed, waiting up to timeout seconds for one.
+        Returns None if no button was pressed in time'''
+        try:
+            name, stamp = self._get(timeout)
+        except Empty:
+            return None
+
+        if name in self.chord:
+            other = self.chord[1] if name == self.chord[0] else self.chord[0]
+            button = self._buttons.get(other)
+            if (button is not None) and button.is_pressed:
+                # wait out the rest of the chord time for the other button's press to drop it
+                try:
+                    next_press = self._get(stamp + self.chord_time - monotonic())
+                except Empty:
+                    return self.chord_evt
+                if (next_press[0] != other) or (abs(next_press[1] - stamp) > self.chord_time):
+                    self._held.appendleft(next_press)
+                return self.chord_evt
+        return name
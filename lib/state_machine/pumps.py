@@ -13,10 +13,12 @@
 
 
 from lib.butterworth import b_filter as BF
+from lib.butterworth.hampel import HampelFilter
 from lib.DFR import DFRobot_EC as EC
 from lib.DFR import DFRobot_PH as PH   
 from lib.state_machine.LCDmenu import timer
-from time import sleep
+from lib.log_sink import get_sink
+from time import sleep, monotonic
 import warnings
 
 class EventError(Exception):
@@ -60,6 +62,25 @@ class hydro():
     sonar_timer = timer(2)
     sonar_timer.timer_set()
     last_sonar = 0
+    # distance (cm) given in place of a reading while the sonar is not detected or stale
+    sonar_fallback = 25
+    # how often a new sonar value is printed during testing
+    sonar_print = timer(5)
+    sonar_print.timer_set()
+    # how often a stale sonar reading is reported
+    stale_print = timer(10)
+    # optional sensor_sampler reading the sonar in the background instead of in the loop
+    sampler = None
+    # monotonic time of the last good sonar reading
+    sonar_time = None
+    # how old the sonar reading can get before it is reported as stale
+    sonar_stale_time = 10
+    # send one ping per reading and give the median of the last sonar_window pings
+    # instead of a burst of pings per reading
+    sonar_stream = False
+    sonar_window = 11
+    # optional reservoir.ReservoirTable to convert the water level to a volume
+    reservoir = None
 
     hole_depth = 35*2.54  # 35in to cm
     s_thresh = 8  # cm
@@ -67,9 +88,15 @@ class hydro():
     str_timer = timer(10)
     str_timer.timer_set()
 
+    # optional storage.ShrubStore to save events to
+    store = None
+
     # counter to trigger outputs during startup process
     n = 0
 
+    # SensorSnapshot shared w/ the conditioner so the sonar is read at most once per tick
+    snapshot = None
+
     def __init__(self, pump, sonar, valves, UV, filter=.5, test=False, output=None):
         self.pump = pump
         self.s = sonar
@@ -82,6 +109,7 @@ class hydro():
 
         self.test = test  # for printing state change and events
         self.output_file = output
+        self.log = get_sink(output) if output is not None else None
 
     def __repr__(self):
         return "state_machine({}, {}, {}, {})".format(self.pump, self.s, self.topValve, self.botValve)
@@ -91,26 +119,17 @@ class hydro():
         if self.test and self.str_timer.timer_event():
             self.printf(f'next cycle timer: {self.timeFormat(self.hydroTimer.time_remaining())}')
             self.str_timer.timer_set()
-        return "Pump: {}\nValves: {}, {}\nWater level: {:.1f} cm\nValves paused? {}\n\
-        Overflow warning? {}".format(
-            self.pumpVal, self.botValveVal, self.topValveVal, self.water_height(), self.vPause,
-            self.overflowCondition
+        return "Pump: {}\nValves: {}, {}\nWater level: {:.1f} cm{}\nWater volume: {:.1f} L\n\
+        Valves paused? {}\nOverflow warning? {}{}".format(
+            self.pumpVal, self.botValveVal, self.topValveVal, self.water_height(),
+            f" (stale {self.sonar_age:.0f} s)" if self.sonar_stale else "", self.water_volume(),
+            self.vPause, self.overflowCondition, " (no sonar)" if self.sonar_stale else ""
         )
 
     def printf(self, msgs, terminal=False):
         '''Save output to terminal to text file'''
-        if self.output_file is not None:
-            if (type(msgs) is str) or (type(msgs).__str__ is object.__str__):
-                with open(self.output_file, 'a') as f:
-                    print(msgs, file=f)
-                if terminal:
-                    print(msgs)
-            else:
-                for msg in msgs:
-                    with open(self.output_file, 'a') as f:
-                        print(msg, file=f)
-                    if terminal:
-                        print(msg)
+        if self.log is not None:
+            self.log.write(msgs, terminal)
         else:
             print(msgs)
 
@@ -132,8 +151,8 @@ class hydro():
         if cycle is not None:
             n = cycle[0]
             self.hydro_state = cycle[0]
-            self.hydroTimer = timer(cycle[1])
-            self.hydroTimer.timer_set()
+            # reuse the timer so the callback given to it is kept
+            self.hydroTimer.timer_set(new=cycle[1])
         # enable outputs on startup once new operating values are passed in from LCDmenu
         if self.n == 0:
             if cycle is None:
@@ -141,8 +160,7 @@ class hydro():
             self.pumpVal = self.pVals[self.hydro_state]
             [self.topValveVal, self.botValveVal] = self.vVals[self.hydro_state]
             if cycle is None:
-                self.hydroTimer = timer(self.actual_times[self.hydro_state])
-                self.hydroTimer.timer_set()
+                self.hydroTimer.timer_set(new=self.actual_times[self.hydro_state])
             
             if self.pumpVal: self.active()
             self.topValve.on() if self.topValveVal else self.topValve.off()
@@ -174,6 +192,8 @@ class hydro():
             self.printf(f'shrub user shut off: {self.userToggle}')
             self.printf(f'shrub overflow condition: {self.overflowCondition}')
             self.printf(f'new shrub event: {evt}')
+        if (self.store is not None) and (evt is not None):
+            self.store.event(evt, 'hydro')
         
         # getting stuck on no overflow even when it should be overflow
         if evt is not None:
@@ -267,12 +287,28 @@ class hydro():
     def water_height(self, hole_depth=None) -> float:
         '''Estimate the water level (cm) in the reservoir given the hole depth.
         Recommended for a range of 9 to 30 cm from the sonar sensor for most accurate 
-        readings.'''
+        readings. Check sonar_stale for how current the reading is.'''
         self.hole_depth = self.hole_depth if hole_depth is None else hole_depth
         return self.s.depth(self.grab_sonar(), self.hole_depth)
 
+    def water_volume(self) -> float:
+        '''Estimate the volume of water (L) in the reservoir from the water level.
+        NaN if there is no reservoir table.'''
+        if self.reservoir is None:
+            return float('nan')
+        return self.reservoir.volume(self.water_height())
+
     def overflow_det(self, height_thresh=None) -> bool:
-        '''Check to see if the water level is higher than the acceptable value'''
+        '''Check to see if the water level is higher than the acceptable value.
+        A stale sonar reading counts as an overflow, since the water reaching the sonar's
+        blind zone also stops the pings. The valves stay paused until a good reading comes in.'''
+        if self.sonar_stale:
+            # None until the first report, so the first one is not held back
+            if self.stale_print.timer_event() is not False:
+                since = "yet" if self.sonar_time is None else f"for {self.sonar_age:.0f} s"
+                self.printf(f"No sonar reading {since}, pausing the valves as an overflow")
+                self.stale_print.timer_set()
+            return True
         height_thresh = (self.hole_depth - self.s_thresh) if height_thresh is None else height_thresh
         height = self.water_height()
         try:
@@ -285,32 +321,81 @@ class hydro():
         '''TO BE REPLACED W/ ANALOG PRESSURE SENSOR
         Tries to grab the sonar sensor value without raising 
         an exception halting the program. The reliable range is 
-        9 to 32 cm.'''
+        9 to 32 cm. Gives the value of the current tick if a snapshot is used.'''
+        if self.snapshot is not None:
+            return self.snapshot.sonar
+        return self.read_sonar()
+
+    def read_sonar(self) -> float:
+        '''Gives the latest reading of the sampler if one is attached. Otherwise reads the sonar
+        sensor if sonar_timer has run out, or gives the last reading.
+        Gives sonar_fallback if there has not been a good reading or it is stale.'''
+        if self.sampler is not None:
+            self.sonar_temperature()
+            value, t = self.sampler.latest
+            if (t is not None) and (t != self.sonar_time):
+                self.last_sonar = value
+                self.sonar_time = t
+                if self.test and self.sonar_print.timer_event():
+                    self.printf(f'New sonar value: {self.last_sonar}')
+                    self.sonar_print.timer_set()
+            return self.sonar_fallback if self.sonar_stale else self.last_sonar
+
         # timer to limit sample rate for faster loop time
         if self.sonar_timer.timer_event():
+            self.sonar_temperature()
             try:
-                self.s.temperature = self.conditioner.grab_temp(unit='C')
-                dist = self.s.raw_distance(sample_size=10, sample_wait=0.01)
-            except (SystemError, UnboundLocalError) as e:
+                dist = self.measure_sonar()
+                self.sonar_time = monotonic()
+            except (SystemError, RuntimeError) as e:
                 # sonar removed from system
                 #self.printf(f"The sonar is not detected: {e}")
                 #warnings.warn("The sonar sensor is not detected.")
-                dist = 25
-            # limiting valid range of measurements
-            if dist >= self.hole_depth:
-                dist = self.hole_depth
-            elif dist < 0:
-                dist = 0
+                dist = self.sonar_fallback
             self.last_sonar = dist
             self.sonar_timer.timer_set()
-            if self.test:
+            if self.test and self.sonar_print.timer_event():
                 self.printf(f'New sonar value: {self.last_sonar}')
+                self.sonar_print.timer_set()
         else:
             if self.test:
                 #self.printf(f'Old sonar value grabbed: {self.last_sonar}')
                 pass
 
-        return self.last_sonar
+        return self.sonar_fallback if self.sonar_stale else self.last_sonar
+
+    def measure_sonar(self) -> float:
+        '''Takes a new sonar reading (cm) limited to the depth of the reservoir. Blocks until
+        every sample is taken, so it is what the sampler runs in its thread. When streaming
+        only one ping is sent.
+        Raises SystemError or RuntimeError when the sonar does not respond.'''
+        if self.sonar_stream:
+            dist = self.s.stream_distance(window=self.sonar_window)
+        else:
+            dist = self.s.raw_distance(sample_size=10, sample_wait=0.01)
+        # limiting valid range of measurements
+        if dist >= self.hole_depth:
+            dist = self.hole_depth
+        elif dist < 0:
+            dist = 0
+        return dist
+
+    def sonar_temperature(self):
+        '''Give the sonar the water temperature for the speed of sound'''
+        temp = self.conditioner.grab_temp(unit='C')
+        # keep the last temperature until the sensor has given a reading
+        if temp == temp:
+            self.s.temperature = temp
+
+    @property
+    def sonar_age(self) -> float:
+        '''Seconds since the last good sonar reading. Infinite if there has not been one'''
+        return float('inf') if self.sonar_time is None else monotonic() - self.sonar_time
+
+    @property
+    def sonar_stale(self) -> bool:
+        '''True if the last good sonar reading is older than sonar_stale_time'''
+        return self.sonar_age > self.sonar_stale_time
 
     def pump_pwm(level, pump):
         """This method is deprecated, use GZ.PWMLED value method instead."""
@@ -339,8 +424,9 @@ class conditioner():
     ph_Low = 4
     EC_High = 2
     EC_Low = 0
-    # how long to run the conditioning pumps for
-    on_timer = timer(3)
+    # how long to run the conditioning pumps for when the reservoir is full
+    dose_time = 3
+    on_timer = timer(dose_time)
     # wait for the reservoir to mix before checking if values are out of range
     wait_timer = timer(15)
     wait_timer.timer_set()
@@ -350,7 +436,26 @@ class conditioner():
     # how often to check temp to increase loop time
     therm_timer = timer(5)
     therm_timer.timer_set()
-    last_therm_val = 0
+    therm_n = 0  # number of times the temperature sensor has been read
+    # optional sensor_sampler reading the temperature sensor in the background instead of in the loop
+    therm_sampler = None
+    # monotonic time of the last reading taken by the sampler
+    therm_time = None
+    # name of the probe in the reservoir, and the last reading of every probe by name
+    therm_channel = 'reservoir'
+    probes = {}
+    therm_errors = 0  # failed readings of the sampler already reported
+    last_therm = {'temp_c': None, 'temp_f': None}
+    # latest raw readings and filtered values kept for telemetry
+    pH_volt = float('nan')
+    EC_volt = float('nan')
+    temp_c = float('nan')
+    last_pH = float('nan')
+    last_EC = float('nan')
+    last_temp_C = float('nan')
+    last_temp_F = float('nan')
+    # temperature at which EC needs no compensation, used until the thermometer gives a reading
+    EC_ref_temp = 25.0
     # how often to print EC values for readability during testing
     EC_print = timer(5)
     EC_print.timer_set()
@@ -361,6 +466,12 @@ class conditioner():
     evt_print = timer(1.5)
     evt_print.timer_set()
     last_pump = 2
+    # optional storage.ShrubStore to save events to
+    store = None
+    # SensorSnapshot shared w/ hydro so each sensor is read and filtered at most once per tick
+    snapshot = None
+    # sensor events are only saved when they are acted on since they repeat every loop
+    sensor_evts = ("LOW EC", "LOW PH", "HIGH PH")
 
     def __init__(self, conditioning_pumps, shrub, pHsens, ECsens, temp, filters=[200, 200, .5], test=False, output=None):
         self.pumps = conditioning_pumps
@@ -377,13 +488,16 @@ class conditioner():
         self.pH = PH.DFRobot_PH()
         self.EC = EC.DFRobot_EC()
         
-        self.fpH = BF.LowPassFilter(filters[0])
-        self.fEC = BF.LowPassFilter(filters[1])
-        self.fTemp_C = BF.LowPassFilter(filters[2])
-        self.fTemp_F = BF.LowPassFilter(filters[2])
+        # one filter per channel, stepped together by read_sensors
+        self.filters = BF.FilterBank([filters[0], filters[1], filters[2], filters[2]],
+            names=('pH', 'EC', 'temp_C', 'temp_F'))
+        # outliers and failed readings are taken out before the low pass filters
+        self.outliers = {'pH': HampelFilter(min_scale=.05), 'EC': HampelFilter(min_scale=.05),
+            'temp_C': HampelFilter(size=7, min_scale=.2), 'temp_F': HampelFilter(size=7, min_scale=.36)}
 
         self.test = test
         self.output_file = output
+        self.log = get_sink(output) if output is not None else None
 
     def __repr__(self):
         return "state_machine({}, {}, {}, {}, {}, {})".format(self.pumpA, self.pumpB, self.pumpC, 
@@ -399,18 +513,8 @@ class conditioner():
 
     def printf(self, msgs, terminal=False):
         '''Save output to terminal to text file'''
-        if self.output_file is not None:
-            if type(msgs) is str:
-                with open(self.output_file, 'a') as f:
-                    print(msgs, file=f)
-                if terminal:
-                    print(msgs)
-            else:
-                for msg in msgs:
-                    with open(self.output_file, 'a') as f:
-                        print(msg, file=f)
-                    if terminal:
-                        print(msg)
+        if self.log is not None:
+            self.log.write(msgs, terminal)
         else:
             print(msgs)
 
@@ -429,6 +533,8 @@ class conditioner():
             self.evt_print.timer_set()
 
         pumpPause = None
+        if (self.store is not None) and (evt is not None) and (evt not in self.sensor_evts):
+            self.store.event(evt, 'conditioner')
 
         if evt is not None:
             if evt == "OVERFLOW":
@@ -475,20 +581,22 @@ class conditioner():
             # wait for reservoir to mix a little before turning on pumps again
             else:
                 if self.wait_timer.timer_event():
+                    if self.store is not None:
+                        self.store.event(evt, 'conditioner')
                     if (evt == "LOW EC"):
                         # TODO re enable when sensor is fixed
                         # sensor currently broken
                         #self.pump_active(self.pumpN)
-                        #self.on_timer.timer_set()
+                        #self.on_timer.timer_set(new=self.dose_length())
                         #self.last_pump = 1
                         pass
                     elif (evt == "LOW PH"):
                         self.pump_active(self.pumpA)
-                        self.on_timer.timer_set()
+                        self.on_timer.timer_set(new=self.dose_length())
                         self.last_pump = 2
                     elif (evt == "HIGH PH"):
                         self.pump_active(self.pumpB)
-                        self.on_timer.timer_set()
+                        self.on_timer.timer_set(new=self.dose_length())
                         self.last_pump = 3
                     self.wait_timer.timer_set(new=18)
 
@@ -500,6 +608,19 @@ class conditioner():
 acid: {self.pumpA.is_active} base: {self.pumpB.is_active}')
             self.evt_print.timer_set()
 
+    def dose_length(self) -> float:
+        '''Seconds to run a conditioning pump so the dose is in proportion to the water in the
+        reservoir. Gives the full dose_time if the volume is not known, the reservoir table
+        is a placeholder, or the sonar reading is stale.'''
+        reservoir = self.hydro.reservoir
+        if (reservoir is None) or reservoir.placeholder or self.hydro.sonar_stale:
+            return self.dose_time
+        volume = self.hydro.water_volume()
+        if volume != volume:
+            return self.dose_time
+        # at least a tenth of a dose so some solution still makes it through the tubing
+        return self.dose_time*min(max(volume/reservoir.capacity, .1), 1.0)
+
     def pump_active(self, pump, pwr=60):
         '''PWM % value to output to motor of pump'''
         if pwr >= 100:
@@ -520,62 +641,163 @@ acid: {self.pumpA.is_active} base: {self.pumpB.is_active}')
 
     def grab_pH(self) -> float:
         '''Tries to grab the pH sensor value 
-        without raising an exception halting the program'''
+        without raising an exception halting the program. Gives the
+        value of the current tick if a snapshot is used.'''
+        if self.snapshot is not None:
+            return self.snapshot.pH
+        return self.read_pH()
+
+    def grab_EC(self, test=False) -> float:
+        '''Tries to grab the conductivity sensor value 
+        without raising an exception halting the program. Gives the
+        value of the current tick if a snapshot is used.'''
+        if self.snapshot is not None:
+            return self.snapshot.EC
+        return self.read_EC(test=test)
+
+    def grab_temp(self, unit="F") -> float:
+        '''Tries to grab the temperature sensor value 
+        without raising an exception halting the program. Gives the
+        value of the current tick if a snapshot is used.'''
+        if self.snapshot is not None:
+            if unit == 'C':
+                return self.snapshot.temp_C
+            elif unit == 'F':
+                return self.snapshot.temp_F
+        return self.read_temp(unit=unit)
+
+    def read_sensors(self) -> tuple:
+        '''Reads every sensor and passes all of them through the filters in one step.
+        Gives the filtered pH, EC, temp (C), and temp (F)'''
+        therm_n = self.therm_n
+        therm = self.read_therm()
+        # the temperature filters are only stepped when there is a new reading so they are not
+        # fed the same value every tick between reads
+        new_temp = self.therm_n != therm_n
+        # EC is compensated w/ the temperature filtered on the last step
+        raw = [self._raw_pH(), self._raw_EC(self._EC_temp(self.filters['temp_F'])), therm['temp_c'], therm['temp_f']]
+        mask = [True, True, new_temp, new_temp]
+        for i, name in enumerate(self.filters.names):
+            if mask[i]:
+                raw[i] = self.outliers[name].filter(raw[i])
+                # failed readings are skipped so the filtered value holds instead of falling to 0
+                if raw[i] is None:
+                    raw[i] = 0.0
+                    mask[i] = False
+        # the step time lets each filter follow the rate it is actually stepped at
+        values = tuple(self.filters.step(raw, t=monotonic(), mask=mask).tolist())
+        self.last_pH, self.last_EC, self.last_temp_C, self.last_temp_F = values
+        return values
+
+    def read_pH(self) -> float:
+        '''Reads the pH sensor and passes it through the filter'''
+        self.last_pH = self._filter_one('pH', self._raw_pH())
+        return self.last_pH
+
+    def read_EC(self, test=False) -> float:
+        '''Reads the conductivity sensor and passes it through the filter'''
+        self.last_EC = self._filter_one('EC', self._raw_EC(self._EC_temp(self.grab_temp()), test=test))
+        return self.last_EC
+
+    def _EC_temp(self, temp) -> float:
+        # the filtered temperature holds its last good value, so it is only NaN before the
+        # thermometer's first reading or w/o one. use the EC reference temperature (no compensation)
+        # then so EC is still measured
+        return self.EC_ref_temp if temp != temp else temp
+
+    def _filter_one(self, name, s_val) -> float:
+        # pass one channel through its outlier and low pass filters. holds the last value for a failed reading
+        s_val = self.outliers[name].filter(s_val)
+        if s_val is None:
+            return self.filters[name]
+        return self.filters.filter_channel(name, s_val)
+
+    def _raw_pH(self) -> float:
         try:
-            dist = self.pH.readPH(self.pHsens.voltage)
+            self.pH_volt = self.pHsens.voltage
+            dist = self.pH.readPH(self.pH_volt)
             if self.test and self.ph_print.timer_event():
-                self.printf(f'ph voltage reading: {self.pHsens.voltage:.3f}')
+                self.printf(f'ph voltage reading: {self.pH_volt:.3f}')
                 self.ph_print.timer_set()
         except Exception as e:
             if self.ph_print.timer_event():
                 self.printf(f"The pH sensor is not detected: {e}")
                 warnings.warn("The pH sensor is not detected")
                 self.ph_print.timer_set()
-            dist = 0
-        return self.fpH.filter(dist)
+            self.pH_volt = float('nan')
+            dist = None
+        return dist
 
-    def grab_EC(self, test=False) -> float:
-        '''Tries to grab the conductivity sensor value 
-        without raising an exception halting the program'''
+    def _raw_EC(self, temp, test=False) -> float:
         try:
-            dist = self.EC.readEC(self.ECsens.voltage, self.grab_temp())*1000
+            self.EC_volt = self.ECsens.voltage
+            dist = self.EC.readEC(self.EC_volt, temp)*1000
             if self.test or test:
                 if self.EC_print.timer_event():
-                    self.printf(f'ec voltage reading: {self.ECsens.voltage:.3f}')
+                    self.printf(f'ec voltage reading: {self.EC_volt:.3f}')
                     self.EC_print.timer_set()
         except Exception as e:  # TODO find correct exceptions here
             if self.EC_print.timer_event():
                 self.EC_print.timer_set()
                 self.printf(f"The conductivity sensor is not detected: {e}")
                 warnings.warn("The conductivity sensor is not detected")
-            dist = 0
-        return self.fEC.filter(dist)
+            self.EC_volt = float('nan')
+            dist = None
+        return dist
+
+    def read_therm(self) -> dict:
+        '''Gives the last Celsius and Farenheit reading of the temperature sensor'''
+        if self.therm_sampler is not None:
+            probes, t = self.therm_sampler.latest
+            if (t is not None) and (t != self.therm_time):
+                self.therm_time = t
+                self.therm_n += 1
+                # the sampler reads every probe. the reservoir's is the one used for conditioning
+                self.probes = probes
+                reading = probes.get(self.therm_channel)
+                if reading is not None:
+                    self.temp_c = float(reading['temp_c'])
+                    self.last_therm = {'temp_c': self.temp_c, 'temp_f': float(reading['temp_f'])}
+                else:
+                    self._therm_failed()
+            elif self.therm_sampler.errors != self.therm_errors:
+                self.therm_errors = self.therm_sampler.errors
+                self.therm_n += 1
+                self._therm_failed()
+            return self.last_therm
 
-    def grab_temp(self, unit="F") -> float:
-        '''Tries to grab the temperature sensor value 
-        without raising an exception halting the program'''
         if self.therm_timer.timer_event():
             # check if it is time to access temp
             # limited as it requires accessing file system and slows loop
             self.therm_timer.timer_set()
+            self.therm_n += 1
             try:
-                if unit == 'C':
-                    dist = float(self.temp.read_temp()['temp_c'])
-                elif unit == 'F':
-                    dist = float(self.temp.read_temp()['temp_f'])
-                else:
-                    self.printf("invalid unit. Try 'F' or 'C'")
+                reading = self.temp.read_temp()
+                self.temp_c = float(reading['temp_c'])
+                self.last_therm = {'temp_c': self.temp_c, 'temp_f': float(reading['temp_f'])}
             except Exception as e:
                 self.printf(f"The temperature sensor is not detected: {e}")
                 warnings.warn("The temperature sensor is not detected")
-                dist = 0
-            self.last_therm_val = dist
-        else:
-            dist = self.last_therm_val
+                self.temp_c = float('nan')
+                self.last_therm = {'temp_c': None, 'temp_f': None}
+        return self.last_therm
+
+    def _therm_failed(self):
+        self.printf("The temperature sensor is not detected")
+        warnings.warn("The temperature sensor is not detected")
+        self.temp_c = float('nan')
+        self.last_therm = {'temp_c': None, 'temp_f': None}
+
+    def read_temp(self, unit="F") -> float:
+        '''Passes the last temperature reading in the given unit through its filter'''
         if unit == 'F':
-            return self.fTemp_F.filter(dist)
+            self.last_temp_F = self._filter_one('temp_F', self.read_therm()['temp_f'])
+            return self.last_temp_F
         elif unit == 'C':
-            return self.fTemp_C.filter(dist)
+            self.last_temp_C = self._filter_one('temp_C', self.read_therm()['temp_c'])
+            return self.last_temp_C
+        else:
+            self.printf("invalid unit. Try 'F' or 'C'")
 
     def sensOutOfRange(self) -> list:
         '''Gives list of strings to pass to event handler. Checks for
@@ -0,0 +1,35 @@
+# state_machine/reporter.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Print the state of each subsystem during testing at its own rate, only building the text
+# when it is about to be printed
+
+from lib.state_machine.LCDmenu import timer, timers
+
+
+class reporter():
+    '''Prints the formatted state of each added subsystem every time its interval runs out.
+    The text is built by calling the function given for the subsystem, so nothing is
+    formatted (or read from the sensors) between reports. Runs off the timer queue.'''
+
+    def __init__(self, printf, queue=timers):
+        self.printf = printf
+        self.queue = queue
+        self.timers = {}
+
+    def add(self, name, interval, build):
+        '''Print build() every interval seconds. Subsystems w/ an interval of 0 or less are not reported'''
+        if (interval is None) or (interval <= 0):
+            return
+        t = timer(interval, queue=self.queue)
+        t.set_callback(lambda: self._report(build, t))
+        t.timer_set()
+        self.timers[name] = t
+
+    def set_interval(self, name, interval):
+        '''Change how often the subsystem is reported, starting from now'''
+        self.timers[name].timer_set(new=interval)
+
+    def _report(self, build, t):
+        self.printf(build())
+        t.timer_set()
@@ -0,0 +1,59 @@
+# state_machine/sensor_sampler.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Take readings of slow sensors (sonar, 1-Wire thermometer) in a background thread so
+# the control loop never waits on them
+
+from threading import Thread, Event
+from time import monotonic
+
+
+class sensor_sampler():
+    '''Calls measure() every period seconds in a daemon thread. The last good reading and the
+    monotonic time it was taken are kept in latest as one (value, time) tuple. The tuple is
+    replaced whole, never changed, so the control loop can read it w/o a lock.
+    latest is (None, None) until the first good reading.'''
+
+    def __init__(self, measure, period=.5, errors=(SystemError, RuntimeError), name='sensor sampler'):
+        self.measure = measure
+        self.period = period
+        # exceptions measure() raises when the sensor does not respond
+        self.catch = errors
+        self.latest = (None, None)
+        self.n = 0  # number of good readings
+        self.errors = 0  # number of readings that failed
+        self.name = name
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        '''Start sampling in the background'''
+        if (self._thread is not None) and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=1):
+        '''Stop sampling and wait up to timeout seconds for the reading in progress'''
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def age(self) -> float:
+        '''Seconds since the last good reading. Infinite if there has not been one'''
+        t = self.latest[1]
+        return float('inf') if t is None else monotonic() - t
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = monotonic()
+            try:
+                value = self.measure()
+            except self.catch:
+                self.errors += 1
+            else:
+                self.latest = (value, monotonic())
+                self.n += 1
+            self._stop.wait(max(0, self.period - (monotonic() - start)))
@@ -0,0 +1,59 @@
+# state_machine/snapshot.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Share one set of sensor values between the state machines and the menu for each
+# tick of the control loop so no sensor is read or filtered more than once per tick
+
+
+class SensorSnapshot(object):
+    '''Sensor values for one tick of the control loop. Each value is read from the sensor
+    and passed through its filter the first time it is asked for in a tick, then the same
+    value is given back until tick() starts the next one. Give the same instance to the
+    hydro and conditioner state machines through their snapshot attribute.'''
+
+    def __init__(self, conditioner, shrub):
+        self.conditioner = conditioner
+        self.shrub = shrub
+        self._values = {}
+        self.n = 0  # number of ticks started
+
+    def tick(self):
+        '''Start a new tick so the next values asked for are read from the sensors'''
+        self._values.clear()
+        self.n += 1
+
+    def _get(self, name, read):
+        try:
+            return self._values[name]
+        except KeyError:
+            value = self._values[name] = read()
+            return value
+
+    def _conditioner(self, i):
+        # every conditioner channel is read and filtered together the first time one is asked for
+        return self._get('conditioner', self.conditioner.read_sensors)[i]
+
+    @property
+    def pH(self) -> float:
+        '''Filtered pH'''
+        return self._conditioner(0)
+
+    @property
+    def EC(self) -> float:
+        '''Filtered conductivity (mS)'''
+        return self._conditioner(1)
+
+    @property
+    def temp_C(self) -> float:
+        '''Filtered temperature (C)'''
+        return self._conditioner(2)
+
+    @property
+    def temp_F(self) -> float:
+        '''Filtered temperature (F)'''
+        return self._conditioner(3)
+
+    @property
+    def sonar(self) -> float:
+        '''Distance from the sonar to the water (cm)'''
+        return self._get('sonar', self.shrub.read_sonar)
@@ -0,0 +1,94 @@
+# storage.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Save sensor samples, state machine events, and settings changes to a local SQLite database
+# so they can be queried instead of searching through the text logs
+
+import sqlite3
+from time import time, monotonic
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (ts REAL NOT NULL, sensor TEXT NOT NULL, value REAL);
+CREATE TABLE IF NOT EXISTS events (ts REAL NOT NULL, event TEXT NOT NULL, source TEXT);
+CREATE TABLE IF NOT EXISTS settings (ts REAL NOT NULL, name TEXT NOT NULL, value TEXT);
+CREATE INDEX IF NOT EXISTS samples_sensor_ts ON samples (sensor, ts);
+CREATE INDEX IF NOT EXISTS events_event_ts ON events (event, ts);
+'''
+
+
+class ShrubStore(object):
+    '''SQLite database in WAL mode for samples, events, and settings changes. Rows are held
+    in memory and inserted in one transaction once batch_size rows are waiting or batch_time
+    seconds have passed since the last insert. Only use an instance from one thread.'''
+
+    def __init__(self, path, batch_size=200, batch_time=30):
+        self.path = path
+        self.batch_size = batch_size
+        self.batch_time = batch_time
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        # WAL keeps the database safe w/ fewer syncs to the SD card
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(_SCHEMA)
+        self._samples = []
+        self._events = []
+        self._settings = []
+        self._last_flush = monotonic()
+
+    def sample(self, sensor, value, ts=None):
+        '''Queue one sensor value'''
+        self._samples.append((time() if ts is None else ts, sensor, value))
+        self._check_flush()
+
+    def samples(self, values, ts=None):
+        '''Queue a dictionary of sensor name: value taken at the same time'''
+        ts = time() if ts is None else ts
+        self._samples.extend((ts, sensor, value) for sensor, value in values.items())
+        self._check_flush()
+
+    def event(self, event, source=None, ts=None):
+        '''Queue an event passed to a state machine'''
+        self._events.append((time() if ts is None else ts, event, source))
+        self._check_flush()
+
+    def setting(self, name, value, ts=None):
+        '''Queue a change to a user setting'''
+        self._settings.append((time() if ts is None else ts, name, str(value)))
+        self._check_flush()
+
+    def _check_flush(self):
+        waiting = len(self._samples) + len(self._events) + len(self._settings)
+        if (waiting >= self.batch_size) or (monotonic() - self._last_flush >= self.batch_time):
+            self.flush()
+
+    def flush(self):
+        '''Insert all queued rows in one transaction'''
+        self._last_flush = monotonic()
+        if not (self._samples or self._events or self._settings):
+            return
+        with self.db:
+            self.db.executemany('INSERT INTO samples VALUES (?, ?, ?)', self._samples)
+            self.db.executemany('INSERT INTO events VALUES (?, ?, ?)', self._events)
+            self.db.executemany('INSERT INTO settings VALUES (?, ?, ?)', self._settings)
+        self._samples = []
+        self._events = []
+        self._settings = []
+
+    def events_since(self, event, since) -> list:
+        '''Gives (time, source) of each time the event happened after since'''
+        self.flush()
+        return self.db.execute('SELECT ts, source FROM events WHERE event = ? AND ts >= ? ORDER BY ts',
+            (event, since)).fetchall()
+
+    def samples_since(self, sensor, since) -> list:
+        '''Gives (time, value) of each sample of the sensor taken after since'''
+        self.flush()
+        return self.db.execute('SELECT ts, value FROM samples WHERE sensor = ? AND ts >= ? ORDER BY ts',
+            (sensor, since)).fetchall()
+
+    def close(self):
+        '''Insert anything still queued and close the database'''
+        if self.db is not None:
+            self.flush()
+            self.db.close()
+            self.db = None
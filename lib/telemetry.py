@@ -0,0 +1,150 @@
+# telemetry.py - ME 195 Shrubbers Project Code
+# Raspberry Pi 4B/3B
+#
+# Record every sensor sample to fixed size binary segment files that can be memory mapped
+# for analysis after the fact. Each segment stores one column after another so a single
+# sensor can be read without touching the rest of the file.
+
+from glob import glob
+from mmap import mmap, ACCESS_READ
+from os import makedirs, remove
+try:
+    from os import posix_fallocate
+except ImportError:  # only on unix
+    posix_fallocate = None
+from os.path import basename, join
+import struct
+
+# column name and struct code of each value in a record
+FIELDS = (
+    ('time', 'd'),  # monotonic time of the sample (s)
+    ('pH_volt', 'f'),  # raw ADC voltage of the pH sensor
+    ('EC_volt', 'f'),  # raw ADC voltage of the conductivity sensor
+    ('temp_c', 'f'),  # last DS18B20 reading (C)
+    ('sonar', 'f'),  # distance from the sonar to the water (cm)
+    ('pH', 'f'),  # filtered pH
+    ('EC', 'f'),  # filtered conductivity (mS)
+    ('temp_filt', 'f'),  # filtered temperature (C)
+    ('water_level', 'f'),  # water height in the reservoir (cm)
+    ('pump', 'f'),  # channel pump PWM value
+    ('outputs', 'B'),  # bit flags of the outputs, see OUTPUT_BITS
+    ('hydro_state', 'B'),  # step of the pump and valve cycle
+)
+# bit of the outputs column used by each on/off output
+OUTPUT_BITS = ('top_valve', 'bot_valve', 'pump_A', 'pump_B', 'pump_N', 'UV')
+
+MAGIC = b'SHRB'
+VERSION = 1
+# magic, version, number of columns, capacity, record count, then the column codes
+_HEADER = struct.Struct('<4sHHII48s')
+HEADER_SIZE = 64
+_COUNT = struct.Struct('<I')
+_COUNT_OFFSET = 12
+
+
+def _layout(codes, capacity) -> list:
+    '''Gives the file offset of the start of each column'''
+    offsets = []
+    offset = HEADER_SIZE
+    for code in codes:
+        offsets.append(offset)
+        offset += struct.calcsize('<' + code) * capacity
+    offsets.append(offset)  # end of file
+    return offsets
+
+
+class TelemetryRecorder(object):
+    '''Appends one record per call to record() into memory mapped segment files in folder.
+    A new segment is started every `capacity` records, and only the newest max_segments
+    segments are kept. Keep capacity a multiple of 8 so every column stays aligned.'''
+
+    def __init__(self, folder, capacity=36000, max_segments=48, fields=FIELDS):
+        self.folder = folder
+        self.capacity = capacity
+        self.max_segments = max_segments
+        self.names = tuple(name for name, _ in fields)
+        self.codes = ''.join(code for _, code in fields)
+        self._packers = tuple(struct.Struct('<' + code) for code in self.codes)
+        self._offsets = _layout(self.codes, capacity)
+        self._size = tuple(p.size for p in self._packers)
+        makedirs(folder, exist_ok=True)
+        existing = self.segments()
+        self._n = int(basename(existing[-1])[10:15]) + 1 if existing else 0
+        self._f = None
+        self._mm = None
+        self.count = 0
+
+    def segments(self) -> list:
+        '''Gives the paths of the saved segments, oldest first'''
+        return sorted(glob(join(self.folder, 'telemetry_?????.shrb')))
+
+    def _open_segment(self):
+        self.path = join(self.folder, f'telemetry_{self._n % 100000:05d}.shrb')
+        self._n += 1
+        self._f = open(self.path, 'w+b')
+        try:
+            self._f.truncate(self._offsets[-1])
+            if posix_fallocate is not None:
+                # reserve the blocks now so a full disk raises OSError here instead of a
+                # SIGBUS when a page of the map is first written
+                posix_fallocate(self._f.fileno(), 0, self._offsets[-1])
+            self._mm = mmap(self._f.fileno(), self._offsets[-1])
+        except OSError:
+            self._f.close()
+            self._f = None
+            remove(self.path)
+            raise
+        _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, len(self.codes), self.capacity, 0,
+            self.codes.encode())
+        self.count = 0
+        # drop the oldest segments
+        for old in self.segments()[:-self.max_segments]:
+            remove(old)
+
+    def record(self, *values):
+        '''Save one sample. Values are given in the order of the fields.
+        Raises OSError if a new segment cannot be started, such as when the disk is full'''
+        if (self._mm is None) or (self.count >= self.capacity):
+            self.close()
+            self._open_segment()
+        mm = self._mm
+        i = self.count
+        for packer, offset, size, value in zip(self._packers, self._offsets, self._size, values):
+            packer.pack_into(mm, offset + i * size, value)
+        self.count = i + 1
+        _COUNT.pack_into(mm, _COUNT_OFFSET, self.count)
+
+    def close(self):
+        '''Write the current segment to disk and close it'''
+        if self._mm is not None:
+            self._mm.flush()
+            self._mm.close()
+            self._f.close()
+            self._mm = None
+            self._f = None
+
+
+def output_bits(*outputs) -> int:
+    '''Pack the on/off state of the outputs, in the order of OUTPUT_BITS, into one byte'''
+    bits = 0
+    for i, out in enumerate(outputs):
+        if out:
+            bits |= 1 << i
+    return bits
+
+
+def read_segment(path, fields=FIELDS) -> dict:
+    '''Memory map a saved segment and give a read only view of each column by name.
+    The views can be passed to numpy.frombuffer to use them as arrays without a copy.'''
+    with open(path, 'rb') as f:
+        mm = mmap(f.fileno(), 0, access=ACCESS_READ)
+    magic, version, n_fields, capacity, count, codes = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a telemetry segment')
+    codes = codes[:n_fields].decode()
+    offsets = _layout(codes, capacity)
+    columns = {}
+    for (name, _), code, offset in zip(fields, codes, offsets):
+        size = struct.calcsize('<' + code)
+        columns[name] = memoryview(mm)[offset:offset + count * size].cast(code)
+    return columns
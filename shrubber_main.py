@@ -13,16 +13,26 @@ Ways to run the program:
     python3 autoupdate.py
     python3 shrubber_main.py
     python3 shrubber_main.py --test
+    python3 shrubber_main.py --profile 60
 '''
 
-from time import sleep, localtime
+from time import sleep, localtime, monotonic, time
 from os import system
 from os.path import abspath, exists, dirname
 import argparse
+import atexit
+import asyncio
+import signal
 
 from gpiozero import Button, PWMLED, LED
 from lib.hcsr04sensor import sensor as hcsr04
-from lib.DS18B20 import TempReader
+from lib.DS18B20 import TempReader, resolution_for, load_names, PROBE_NAMES
+from lib.loop_stats import LoopStats
+from lib.log_sink import get_sink
+from lib.telemetry import TelemetryRecorder, output_bits
+from lib.history import SensorHistory
+from lib.storage import ShrubStore
+from lib.reservoir import ReservoirTable, LITERS_PER_GALLON
 from lib.lcd.lcd import LCD
 from lib.lcd.i2c_pcf8574_interface import I2CPCF8574Interface
 from lib.lcd.lcd import CursorMode
@@ -37,6 +47,11 @@ from adafruit_ads1x15.analog_in import AnalogIn
 # state machine
 import lib.state_machine.LCDmenu as LCDmenu
 from lib.state_machine import pumps
+from lib.butterworth import b_filter as BF
+from lib.state_machine.button_queue import button_queue
+from lib.state_machine.snapshot import SensorSnapshot
+from lib.state_machine.reporter import reporter
+from lib.state_machine.sensor_sampler import sensor_sampler
 
 # log file directory
 log_path = dirname(dirname(abspath(__file__)))
@@ -54,26 +69,24 @@ while file_exists:
 # create file
 with open(output_file, 'w') as f:
     pass
+# buffered writer shared with the state machines
+log = get_sink(output_file)
 
 def printf(msgs, terminal=False):
     '''Save output to terminal to text file'''
-    if (type(msgs) is str) or (type(msgs).__str__ is object.__str__):
-        with open(output_file, 'a') as f:
-            print(msgs, file=f)
-        if terminal:
-            print(msgs)
-    else:
-        for msg in msgs:
-            with open(output_file, 'a') as f:
-                print(msg, file=f)
-            if terminal:
-                print(msg)
+    log.write(msgs, terminal)
 
 # testing parameters
 parser = argparse.ArgumentParser(description='Modify startup conditions of the program')
 parser.add_argument('--test', required=False,default=False, type=bool, help='Print sensors and events')
 parser.add_argument('--pygame', required=False,default=False, type=bool, help='Simulate LCD menu presses with mouse and keyboard')
 parser.add_argument('--done', required=False,default=False, type=bool, help='do not run loop')
+parser.add_argument('--report-cond', required=False,default=4, type=float, help='Seconds between conditioner prints in test mode, 0 to stop')
+parser.add_argument('--report-shrub', required=False,default=4, type=float, help='Seconds between pump and valve prints in test mode, 0 to stop')
+parser.add_argument('--profile', required=False,default=0, type=float, help='Print loop stage timings every PROFILE seconds')
+parser.add_argument('--temp-period', required=False,default=2, type=float, help='Seconds between temperature readings in the background. Shorter periods lower the resolution to convert faster')
+parser.add_argument('--sonar-period', required=False,default=.06, type=float, help='Seconds between sonar pings in the background, 0 to ping it from the loop')
+parser.add_argument('--probes', required=False,default=None, type=str, help='CSV of the 1-Wire ID and name of each temperature probe. Defaults to probes.csv next to the logs')
 args = parser.parse_args()
 
 if args.pygame:
@@ -87,8 +100,6 @@ if args.pygame:
         printf("Pygame has not been loaded as it does not work w/o a monitor.")
 
 if args.test:
-    test_timer = LCDmenu.timer(4)
-    test_timer.timer_set()
     i2c = IIC(SCL, SDA)
     with i2c:
         printf(["I2C addresses found:",
@@ -111,7 +122,16 @@ pumpN = LED(PINS['pumpN'])
 condP = [pumpA, pumpB, pumpN]  
 UV = LED(PINS['uv_filter'])         
 
-buttons = {k: Button(v) for k, v in PINS.items() if k[1:3] == '_B'}
+# ignore switch bounce shorter than this (s)
+BOUNCE_TIME = .05
+# a held button repeats its press this often (s)
+REPEAT_TIME = .175
+buttons = {k: Button(v, bounce_time=BOUNCE_TIME, hold_time=REPEAT_TIME, hold_repeat=True)
+    for k, v in PINS.items() if k[1:3] == '_B'}
+# presses are queued from the gpiozero callbacks instead of checking is_pressed
+presses = button_queue()
+for name, button in buttons.items():
+    presses.add_button(name, button)
 valves = [LED(PINS['valve1']), LED(PINS['valve2'])]
 
 # initialize i2c bus to use with  LCD   
@@ -134,10 +154,22 @@ except (OSError, ValueError, AttributeError) as e:
 
 # create sonar sensor instance
 sonar = hcsr04.Measurement(PINS['res_trig'], PINS['res_echo'])
+# the sonar keeps its pins set up until the program exits
+atexit.register(sonar.close)
+
+# temperature probes are named by their 1-Wire ID so adding or replacing one does not change
+# which probe is the reservoir's. the file is written w/ the names in order of the IDs if missing
+probe_file = f'{log_path}/probes.csv' if args.probes is None else args.probes
+try:
+    probe_names = load_names(probe_file)
+except (OSError, ValueError):
+    probe_names = None
 
 # check temp sensor connecton
 try:
-    tempSens = TempReader()
+    # the most precise resolution that still converts well within the period between readings
+    tempSens = TempReader(names=PROBE_NAMES if probe_names is None else probe_names,
+        resolution=resolution_for(args.temp_period))
 except IndexError as e:
     printf(["1-Wire connection is bad.\
         Try checkng connection. Attempting reboot to fix.", e])
@@ -148,160 +180,335 @@ except IndexError as e:
     tempSens = "dummy instance"
 
 
+# reuse filter designs saved by earlier runs instead of recalculating them
+coeff_file = f'{log_path}/filter_coefficients.json'
+BF.load_coefficients(coeff_file)
+BF.report = printf
+
 # creating instance of state machines
 shrub = pumps.hydro(pumpM, sonar, valves, UV, test=args.test, output=output_file)
 condition = pumps.conditioner(condP, shrub, pHsens, ECsens, tempSens, test=args.test, output=output_file)
 # pass in instance of conditioner to have them communicate
 shrub.conditioner = condition
+# sensor values shared by the state machines and menu for each tick of the sensor task
+snapshot = SensorSnapshot(condition, shrub)
+shrub.snapshot = condition.snapshot = snapshot
+# volume of water at each depth of the reservoir. calibrate the tank by replacing reservoir.csv
+# w/ the depths and volumes of a fill run, otherwise a straight sided 60 gal tank is assumed.
+# the assumed table is not saved so it is never mistaken for a calibration
+reservoir_file = f'{log_path}/reservoir.csv'
+try:
+    shrub.reservoir = ReservoirTable.load(reservoir_file)
+except (OSError, ValueError):
+    shrub.reservoir = ReservoirTable.straight(60*LITERS_PER_GALLON, shrub.hole_depth, placeholder=True)
+    printf(f"No reservoir table at {reservoir_file}, assuming a straight sided 60 gal tank")
+
+# one sonar ping at a time w/ a rolling median instead of bursts of pings
+shrub.sonar_stream = True
+# read the sonar in its own thread so the loop never waits on it
+if args.sonar_period > 0:
+    shrub.sampler = sensor_sampler(shrub.measure_sonar, period=args.sonar_period, name='sonar sampler')
+    shrub.sampler.start()
+    atexit.register(shrub.sampler.stop)
+else:
+    # shortest time between pings for old echoes to die out
+    shrub.sonar_timer.timer_set(new=.06)
+# read the thermometers in their own thread as each reading waits up to 750 ms for the sensors
+if isinstance(tempSens, TempReader):
+    if probe_names is None:
+        printf(f"No probe names at {probe_file}, naming the probes in order of their IDs")
+        try:
+            tempSens.save_names(probe_file)
+        except OSError as e:
+            printf(["Probe names could not be saved:", e])
+    # the reservoir probe's temperature is the one used for EC compensation
+    condition.therm_channel = 'reservoir'
+    probe_list = ', '.join(f'{name} {probe_id}' for name, probe_id in tempSens.ids.items())
+    printf(f"Temperature probes found: {probe_list} ({tempSens.resolution} bit)")
+    if condition.therm_channel not in tempSens.names:
+        printf(f"No probe is named {condition.therm_channel} in {probe_file}, EC is compensated at {condition.EC_ref_temp} C")
+    # every probe is converted at once, then read
+    condition.therm_sampler = sensor_sampler(tempSens.read_all, period=args.temp_period,
+        errors=(OSError, ValueError, IndexError), name='temperature sampler')
+    condition.therm_sampler.start()
+    atexit.register(condition.therm_sampler.stop)
+
 menu = LCDmenu.menu(LCD, shrub, condition, test=args.test, output=output_file)
 
-# timer to wait between accepting button presses to prevent repeats
-button_timer = LCDmenu.timer(.175)
 # timer to automatically save pump cycle timings to file
 saveCycleTime = LCDmenu.timer(60*1)
 
+# longest the button task waits for a press before checking if the program is done (s)
+BUTTON_WAIT = .5
+# how often pygame is checked for keyboard input (s)
+PYGAME_PERIOD = .02
+# how often the sensors are sampled and passed to the butterworth filters (s)
+SENSOR_PERIOD = .05
+# longest the timer task sleeps before checking the timers again (s)
+MAX_TIMER_SLEEP = .5
+
 printf("Now expecting user input")
 menu.idle()
-button_timer.timer_set()
 saveCycleTime.timer_set()
 
 done = args.done
 
-for _ in range(5):
-    # TODO when finished, reduce loop time for easier user input
+
+# always-on binary record of every sensor sample
+try:
+    recorder = TelemetryRecorder(f'{log_path}/telemetry')
+    atexit.register(recorder.close)
+except OSError as e:
+    printf(["Telemetry will not be recorded:", e])
+    recorder = None
+
+# database of sensor samples, state machine events, and settings changes
+try:
+    store = ShrubStore(f'{log_path}/shrubber.db')
+    atexit.register(store.close)
+    shrub.store = condition.store = menu.store = store
+except Exception as e:  # sqlite3.Error or OSError
+    printf(["Database could not be opened:", e])
+    store = None
+
+# filter designs calculated since the coefficients were loaded, such as the ones made for the
+# state machines above, are saved now and again on exit
+def save_coefficients():
+    '''Save filter designs calculated since the last save, such as the ones for the measured sample rates'''
     try:
-        while (not done):
-            
-            if args.test:
-                a = str(condition)
-                b = str(shrub)
-                if test_timer.timer_event():
-                    printf(a)
-                    printf(b)
-                    test_timer.timer_set()
-            
-            # prevent repeat events for one press
-            if button_timer.event_no_reset():
-                # press A and B to turn on all outputs for a short period
-                if buttons['A_B'].is_pressed and buttons['B_B'].is_pressed:
-                    menu.evt_handler(evt="TEST")
-                    button_timer.timer_set()
-                # detect user input
-                elif buttons['A_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='A_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                elif buttons['B_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='B_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                elif buttons['L_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='L_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                elif buttons['R_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='R_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                elif buttons['D_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='D_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                elif buttons['U_B'].is_pressed:
-                    #start_time = time()
-                    menu.evt_handler(evt='U_B')
-                    button_timer.timer_set()
-                    #print(f'Execution time of menu event handler: {time()-start_time}')
-                if args.pygame:
-                    try:
-                        # simulate button presses w/ keyboard input
-                        for event in pygame.event.get():
-                            if (event.type == pygame.QUIT):
-                                done = True
-                                break
-                            elif event.type == pygame.KEYDOWN:
-                                printf("key is pressed")
-                                if (event.key == pygame.K_w) or (event.key == pygame.K_UP):
-                                    menu.evt_handler(evt='U_B')
-                                    button_timer.timer_set()
-                                if event.key == pygame.K_s or (event.key == pygame.K_DOWN):
-                                    menu.evt_handler(evt='D_B')
-                                    button_timer.timer_set()
-                                if event.key == pygame.K_d or (event.key == pygame.K_RIGHT):
-                                    menu.evt_handler(evt='R_B')
-                                    button_timer.timer_set()
-                                if event.key == pygame.K_a or (event.key == pygame.K_LEFT):
-                                    menu.evt_handler(evt='L_B')
-                                    button_timer.timer_set()
-                                if event.key == pygame.K_q or (event.key == pygame.K_z):
-                                    menu.evt_handler(evt='A_B')
-                                    button_timer.timer_set()
-                                if event.key == pygame.K_e or (event.key == pygame.K_x):
-                                    menu.evt_handler(evt='B_B')
-                                    button_timer.timer_set()
-                                if (event.key == pygame.K_ESCAPE):
-                                    done = True
-                                    LCD.clear()
-                                    printf("Esc exits program. Goodbye")
-                                    LCD.print("Esc exits program. Goodbye")
-                    except Exception as e:
-                        pass  # headless running of pi prevents use of pygame
-
-            # wait for lack of user input to set menu to idle
-            if menu.idle_timer.timer_event():
-                menu.evt_handler(timer=True)
-
-            # check for pump flood-drain cycle progess
-            if shrub.hydroTimer.timer_event():
-                shrub.evt_handler(evt='TIME')
-
-            # turn the conditioners on or off
-            if condition.on_timer.timer_event():
-                condition.evt_handler(evt='ON TIMER')
-            
-            # grab all sensor values to pass to butterworth filter with higher frequency
-            temp = condition.sensOutOfRange()
-            if condition.wait_timer.event_no_reset():
-                # timer is reset in event handler as long as the pumps are not being paused
-                for event in temp:
-                    if event is not None:
-                        condition.evt_handler(evt=event)
+        BF.save_coefficients(coeff_file)
+    except OSError as e:
+        printf(["Filter coefficients could not be saved:", e])
+
+save_coefficients()
+atexit.register(save_coefficients)
+
+# how often the sensor values are saved to the database (s)
+DB_SAMPLE_PERIOD = 10
+
+# recent sensor values and per minute/hour trends kept in memory
+history = SensorHistory(channels=('pH', 'EC', 'temp', 'level'))
+
+# run times of each stage of the loop. send SIGUSR1 to print them at any time
+stats = LoopStats()
+
+
+def print_stats():
+    '''Save the run times of each loop stage to the output file and show them in the terminal'''
+    printf(stats.report(), terminal=True)
+
+
+def update_cursor():
+    '''Show cursor position as a line when changing params'''
+    with stats.stage('set_cursor_mode'):
+        _update_cursor()
+
+
+def _update_cursor():
+    if type(menu.parent) is int:
+        if menu.parent <= 3:
+            LCD.set_cursor_mode(CursorMode.LINE)
+            menu.LCD.set_cursor_pos(1, menu.m2_hover)
+    elif (menu.parent == 'pH THRESH') or (menu.parent == 'EC THRESH'):
+        LCD.set_cursor_mode(CursorMode.LINE)
+        menu.LCD.set_cursor_pos(1, menu.m2_hover)
+    else:
+        LCD.set_cursor_mode(CursorMode.HIDE)
+
+
+def menu_event(evt=None, timer=False):
+    '''Pass an event to the menu and update the cursor to match the new menu state'''
+    with stats.stage('menu.evt_handler'):
+        menu.evt_handler(evt=evt, timer=timer)
+    update_cursor()
+
+
+async def button_task():
+    '''Wait for button presses to be queued and pass them to the menu'''
+    loop = asyncio.get_running_loop()
+    while not done:
+        # blocking wait for a press is done off the event loop
+        evt = await loop.run_in_executor(None, presses.get_event, BUTTON_WAIT)
+        if evt is not None:
+            menu_event(evt=evt)
+
+
+async def pygame_task():
+    '''Simulate button presses w/ keyboard input by queueing them like the buttons'''
+    global done
+    keys = {pygame.K_w: 'U_B', pygame.K_UP: 'U_B', pygame.K_s: 'D_B', pygame.K_DOWN: 'D_B',
+        pygame.K_d: 'R_B', pygame.K_RIGHT: 'R_B', pygame.K_a: 'L_B', pygame.K_LEFT: 'L_B',
+        pygame.K_q: 'A_B', pygame.K_z: 'A_B', pygame.K_e: 'B_B', pygame.K_x: 'B_B'}
+    while not done:
+        try:
+            for event in pygame.event.get():
+                if (event.type == pygame.QUIT):
+                    done = True
+                    break
+                elif event.type == pygame.KEYDOWN:
+                    printf("key is pressed")
+                    if event.key in keys:
+                        presses.put(keys[event.key])
+                    if (event.key == pygame.K_ESCAPE):
+                        done = True
+                        LCD.clear()
+                        printf("Esc exits program. Goodbye")
+                        LCD.print("Esc exits program. Goodbye")
+        except Exception as e:
+            return  # headless running of pi prevents use of pygame
+        await asyncio.sleep(PYGAME_PERIOD)
+
+
+async def timer_task():
+    '''Run the callbacks of the timers that are due and sleep until the next timer runs out'''
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+    # a timer set by another task to run out before the one being slept on wakes this task up
+    LCDmenu.timers.on_sooner = lambda: loop.call_soon_threadsafe(wake.set)
+    try:
+        while not done:
+            wake.clear()
+            LCDmenu.timers.run_expired()
+            try:
+                await asyncio.wait_for(wake.wait(),
+                    min(LCDmenu.timers.time_until_next(MAX_TIMER_SLEEP), MAX_TIMER_SLEEP))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        LCDmenu.timers.on_sooner = None
+
 
-            # use sonar to see if the reservoir is dangerously full, stop valves.
+def idle_print():
+    '''If menu is idle then print next sensor data to LCD'''
+    if menu.state == "IDLE":
+        with stats.stage('idle_print'):
+            menu.idle_print()
+
+
+def shrub_event(evt):
+    '''Pass an event to the pump and valve state machine'''
+    with stats.stage('shrub.evt_handler'):
+        shrub.evt_handler(evt=evt)
+
+
+def condition_event(evt):
+    '''Pass an event to the conditioning pump state machine'''
+    with stats.stage('condition.evt_handler'):
+        condition.evt_handler(evt=evt)
+
+
+def water_level() -> float:
+    '''Water level (cm) the display and overflow check go by. NaN while the sonar reading is stale'''
+    return float('nan') if shrub.sonar_stale else shrub.water_height()
+
+
+def record_telemetry():
+    '''Save the latest raw and filtered sensor values and the state of the outputs.
+    Turns the recorder off if it cannot write, so the sensor task keeps running'''
+    global recorder
+    try:
+        recorder.record(monotonic(), condition.pH_volt, condition.EC_volt, condition.temp_c,
+            float('nan') if shrub.sonar_stale else shrub.grab_sonar(), condition.last_pH,
+            condition.last_EC, condition.last_temp_C, water_level(), pumpM.value,
+            output_bits(valves[0].value, valves[1].value, pumpA.value, pumpB.value, pumpN.value, UV.value),
+            shrub.hydro_state)
+    except OSError as e:
+        printf(["Telemetry could not be recorded and has been turned off:", e])
+        try:
+            recorder.close()
+        except OSError:
+            pass
+        recorder = None
+
+
+def store_samples():
+    '''Save the filtered sensor values to the database'''
+    store.samples({'pH': condition.last_pH, 'EC': condition.last_EC, 'temp': condition.last_temp_C,
+        'water level': water_level()})
+    db_timer.timer_set()
+
+
+def save_cycle():
+    '''Save the pump cycle state to the settings file'''
+    with stats.stage('saveParamChange'):
+        menu.saveParamChange(cycle=True)
+    # only writes the file if a new design was calculated
+    save_coefficients()
+
+
+async def sensor_task():
+    '''Sample the sensors at a fixed rate and pass out of range or overflow events to the state machines'''
+    while not done:
+        snapshot.tick()
+
+        # grab all sensor values to pass to butterworth filter with higher frequency
+        with stats.stage('sensOutOfRange'):
+            temp = condition.sensOutOfRange()
+        if condition.wait_timer.event_no_reset():
+            # timer is reset in event handler as long as the pumps are not being paused
+            for event in temp:
+                if event is not None:
+                    condition_event(event)
+
+        # use sonar to see if the reservoir is dangerously full, stop valves.
+        with stats.stage('overflow_det'):
             test_overflow = shrub.overflow_det()
-            # check to see if the shrub already detects overflow to prevent repeated events
-            if test_overflow and (shrub.overflowCondition != "OVERFLOW"):
-                shrub.evt_handler(evt="OVERFLOW")
-                condition.evt_handler(evt="OVERFLOW")
-            # allow valves to open up again if not overflowing
-            elif (shrub.overflowCondition == "OVERFLOW") and (not test_overflow):
-                shrub.evt_handler(evt="NO OVERFLOW")
-                condition.evt_handler(evt="NO OVERFLOW")
-            
-            # if menu is idle then print next sensor data to LCD
-            if menu.state == "IDLE" and menu.idle_printer.timer_event():
-                menu.idle_print()
-
-            # Show cursor position as a line when changing params
-            if type(menu.parent) is int:
-                if menu.parent <= 3:
-                    LCD.set_cursor_mode(CursorMode.LINE)
-                    menu.LCD.set_cursor_pos(1, menu.m2_hover)
-            elif (menu.parent == 'pH THRESH') or (menu.parent == 'EC THRESH'):
-                LCD.set_cursor_mode(CursorMode.LINE)
-                menu.LCD.set_cursor_pos(1, menu.m2_hover)
-            else:
-                LCD.set_cursor_mode(CursorMode.HIDE)
-            
-            # save pump cycle state after some time
-            if saveCycleTime.timer_event():
-                menu.saveParamChange(cycle=True)
-                    
+        # check to see if the shrub already detects overflow to prevent repeated events
+        if test_overflow and (shrub.overflowCondition != "OVERFLOW"):
+            shrub_event("OVERFLOW")
+            condition_event("OVERFLOW")
+        # allow valves to open up again if not overflowing
+        elif (shrub.overflowCondition == "OVERFLOW") and (not test_overflow):
+            shrub_event("NO OVERFLOW")
+            condition_event("NO OVERFLOW")
+
+        history.add(time(), (condition.last_pH, condition.last_EC, condition.last_temp_C,
+            water_level()))
+        if recorder is not None:
+            with stats.stage('telemetry'):
+                record_telemetry()
+
+        await asyncio.sleep(SENSOR_PERIOD)
+
+
+# timer events handled by the timer queue instead of checking each timer
+# wait for lack of user input to set menu to idle
+menu.idle_timer.set_callback(lambda: menu_event(timer=True))
+# check for pump flood-drain cycle progess
+shrub.hydroTimer.set_callback(lambda: shrub_event('TIME'))
+# turn the conditioners off once they have run long enough
+condition.on_timer.set_callback(lambda: condition_event('ON TIMER'))
+menu.idle_printer.set_callback(idle_print)
+# save pump cycle state after some time
+saveCycleTime.set_callback(save_cycle)
+# save a sample of the sensors to the database every so often
+if store is not None:
+    db_timer = LCDmenu.timer(DB_SAMPLE_PERIOD, callback=store_samples)
+    db_timer.timer_set()
+# print the state of each subsystem in test mode. only formatted when it is printed
+if args.test:
+    reports = reporter(printf)
+    reports.add('conditioner', args.report_cond, lambda: str(condition))
+    reports.add('hydro', args.report_shrub, lambda: str(shrub))
+# print the loop stage timings every so often if asked to
+if args.profile > 0:
+    stats_timer = LCDmenu.timer(args.profile, callback=lambda: (print_stats(), stats_timer.timer_set()))
+    stats_timer.timer_set()
+
+
+async def run():
+    '''Run the buttons, timers, and sensors as separate tasks until the program is told to stop'''
+    update_cursor()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, print_stats)
+    tasks = [button_task(), timer_task(), sensor_task()]
+    if args.pygame:
+        tasks.append(pygame_task())
+    await asyncio.gather(*tasks)
+
+
+for _ in range(5):
+    try:
+        asyncio.run(run())
         printf("State machine loop broken. Attempting relaunch")
         LCD.print("State machine loop broken. Attempting relaunch")
         sleep(4)
@@ -325,4 +532,6 @@ for _ in range(5):
         
         sleep(60)
         LCD.print('Reboot system and check wire connections')
-        system('python /home/pi/THE-SHRUBBERS/autoupdate.py --no-shrub')
\ No newline at end of file
+        # relaunched program runs before this one exits
+        log.flush()
+        system('python /home/pi/THE-SHRUBBERS/autoupdate.py --no-shrub')